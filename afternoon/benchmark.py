@@ -0,0 +1,89 @@
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+
+import numpy as np
+
+from wordle import Wordle, WordleSolver, STRATEGIES, get_pattern_matrix
+
+WORD_LISTS = [os.path.join(os.path.dirname(os.path.abspath(__file__)), name) for name in ("word_list.txt", "words.txt")]
+MAX_GUESSES = 6
+
+worker_words = None
+worker_strategy = None
+
+
+def load_words(path):
+    with open(path) as file:
+        return [word for word in (line.strip().lower() for line in file) if len(word) == 5]
+
+
+def init_worker(words, strategy):
+    global worker_words, worker_strategy
+    worker_words, worker_strategy = words, strategy
+
+
+def play(secret):
+    # Runs in a worker. Returns (guesses used, solved, seconds the solver spent on each guess).
+    game = Wordle(worker_words, secret)
+    solver = WordleSolver(worker_words, worker_strategy)
+    solver.solve(game, verbose=False)
+    return len(game.guesses), game.guesses[-1] == secret, solver.guess_seconds
+
+
+def run_benchmark(words, strategy="entropy", workers=1, limit=None):
+    secrets = words[:limit]
+    # Built (or mapped) and warmed up here first, so forked workers share the pattern matrix and the opening
+    # guess instead of each computing them.
+    get_pattern_matrix(words)
+    WordleSolver(words, strategy).choose_best_guess()
+    histogram = [0] * (MAX_GUESSES + 1)  # index 0 counts failures
+    latencies = []
+    start = time.perf_counter()
+    if workers <= 1:
+        init_worker(words, strategy)
+        results = map(play, secrets)
+    else:
+        pool = multiprocessing.Pool(workers, init_worker, (words, strategy))
+        results = pool.imap_unordered(play, secrets, chunksize=16)
+    for guesses, solved, seconds in results:
+        histogram[guesses if solved else 0] += 1
+        latencies += seconds
+    if workers > 1:
+        pool.close()
+        pool.join()
+    return histogram, latencies, time.perf_counter() - start
+
+
+def report(name, histogram, latencies, elapsed):
+    games = sum(histogram)
+    solved = games - histogram[0]
+    print(f"{name}: {games} games")
+    for guesses in range(1, MAX_GUESSES + 1):
+        print(f"  {guesses}: {histogram[guesses]:6} {'#' * round(50 * histogram[guesses] / games)}")
+    print(f"  X: {histogram[0]:6} {'#' * round(50 * histogram[0] / games)}")
+    mean = sum(guesses * histogram[guesses] for guesses in range(1, MAX_GUESSES + 1)) / max(solved, 1)
+    print(f"  failure rate {100 * histogram[0] / games:.2f}%, mean guesses {mean:.3f} (solved games)")
+    p50, p90, p99 = np.percentile(latencies, [50, 90, 99]) * 1000
+    print(f"  {games / elapsed:.1f} games/s, per-guess latency p50 {p50:.2f} ms, p90 {p90:.2f} ms, "
+          f"p99 {p99:.2f} ms, max {1000 * max(latencies):.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Solve every word of the word lists and report how the solver did.")
+    parser.add_argument("word_lists", nargs="*", default=WORD_LISTS)
+    parser.add_argument("--strategy", choices=STRATEGIES, default="entropy")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--limit", type=int, help="only play the first LIMIT words of each list")
+    args = parser.parse_args()
+    for path in args.word_lists:
+        words = load_words(path)
+        if not words:
+            sys.exit(f"No five-letter words in {path}")
+        report(os.path.basename(path), *run_benchmark(words, args.strategy, args.workers, args.limit))
+
+
+if __name__ == "__main__":
+    main()
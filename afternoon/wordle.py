@@ -1,10 +1,158 @@
+import hashlib
+import os
 import random
+import time
+import numpy as np
 import requests
 
+# Feedback for a guess is one base-3 digit per letter, first letter lowest: 0 to 242, where 242 is all green.
+GRAY, YELLOW, GREEN = 0, 1, 2
+FEEDBACK_NAMES = ("Gray", "Yellow", "Green")
+ALL_GREEN = 242
+
+def get_feedback(guess, secret):
+    # Greens first; then each remaining guess letter is yellow only while the secret still has an unmatched
+    # copy of it, so a letter guessed twice but present once scores one yellow, not two.
+    if guess == secret:
+        return ALL_GREEN
+    unmatched = [s for g, s in zip(guess, secret) if g != s]
+    pattern = 0
+    place = 1
+    for g, s in zip(guess, secret):
+        if g == s:
+            pattern += GREEN * place
+        elif g in unmatched:
+            pattern += YELLOW * place
+            unmatched.remove(g)
+        place *= 3
+    return pattern
+
+def feedback_to_names(pattern):
+    names = []
+    for _ in range(5):
+        names.append(FEEDBACK_NAMES[pattern % 3])
+        pattern //= 3
+    return names
+
+# The feedback of every guess against every answer, as a uint8 matrix indexed [guess, answer]. Built once per
+# word list and saved next to this file, named by a hash of the list, then memory-mapped by later runs.
+PATTERN_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+PATTERN_CHUNK = 256  # guess rows computed at a time while building
+pattern_matrices = {}
+
+def encode_words(words):
+    return np.frombuffer("".join(words).encode("ascii"), dtype=np.uint8).reshape(len(words), 5)
+
+def build_pattern_matrix(guesses, answers):
+    # Same rules as get_feedback, for a block of guesses at once: a non-green letter is yellow while the
+    # answer's unmatched copies of it outnumber the earlier non-green copies in the guess.
+    guess_letters = encode_words(guesses)
+    answer_letters = encode_words(answers)
+    matrix = np.empty((len(guesses), len(answers)), dtype=np.uint8)
+    for start in range(0, len(guesses), PATTERN_CHUNK):
+        block = guess_letters[start:start + PATTERN_CHUNK]
+        green = block[:, None, :] == answer_letters[None, :, :]
+        patterns = np.zeros(green.shape[:2], dtype=np.uint8)
+        for i in range(5):
+            letter = block[:, i, None]
+            supply = ((answer_letters[None, :, :] == letter[:, :, None]) & ~green).sum(axis=2)
+            demand = np.zeros_like(supply)
+            for j in range(i):
+                demand += (block[:, j, None] == letter) & ~green[:, :, j]
+            digit = np.where(green[:, :, i], GREEN, np.where(supply > demand, YELLOW, GRAY)).astype(np.uint8)
+            patterns += digit * np.uint8(3 ** i)
+        matrix[start:start + PATTERN_CHUNK] = patterns
+    return matrix
+
+def word_list_key(word_list):
+    return hashlib.sha1("\n".join(word_list).encode()).hexdigest()[:16]
+
+def get_pattern_matrix(word_list):
+    key = word_list_key(word_list)
+    if key not in pattern_matrices:
+        path = os.path.join(PATTERN_DIRECTORY, f"patterns-{key}.npy")
+        if not os.path.exists(path):
+            # written under a temporary name first, so another process never maps a half-written file
+            temporary = f"{path}.{os.getpid()}.tmp"
+            with open(temporary, "wb") as file:
+                np.save(file, build_pattern_matrix(word_list, word_list))
+            os.replace(temporary, path)
+        pattern_matrices[key] = np.load(path, mmap_mode="r")
+    return pattern_matrices[key]
+
+# Guess strategies: "entropy" maximizes the expected information of the feedback, "expected_size" minimizes the
+# expected number of candidates left after it, "first" guesses the first remaining candidate.
+STRATEGIES = ("entropy", "expected_size", "first")
+SCORE_CHUNK = 32  # guess rows histogrammed at a time; small blocks stay in cache
+opening_guesses = {}  # (word list key, strategy) -> best first guess, the same for every game
+
+def score_guesses(patterns, candidates, strategy):
+    # One score per guess (row of patterns), lower is better. Each row's feedback against the candidates is
+    # histogrammed into 243 bins with a single bincount; with bin sizes c over n candidates, the entropy is
+    # log2(n) - sum(c * log2(c)) / n and the expected number left is sum(c * c) / n.
+    scores = np.empty(len(patterns))
+    offsets = np.arange(SCORE_CHUNK, dtype=np.int32)[:, None] * 243
+    for start in range(0, len(patterns), SCORE_CHUNK):
+        block = patterns[start:start + SCORE_CHUNK, candidates]
+        counts = np.bincount((block + offsets[:len(block)]).ravel(), minlength=len(block) * 243)
+        counts = counts.reshape(len(block), 243)
+        if strategy == "entropy":
+            scores[start:start + len(block)] = (counts * np.log2(np.maximum(counts, 1))).sum(axis=1)
+        else:
+            scores[start:start + len(block)] = (counts * counts).sum(axis=1)
+    return scores
+
+# What a set of feedback says about the secret, as integer masks over the 26 letters: the letters each position
+# may still hold, and the least and most copies of each letter. Feedback from any number of turns can be
+# added before filtering, and matching words are exactly those that would have given all of it.
+class LetterConstraints:
+    def __init__(self):
+        self.allowed = np.full(5, (1 << 26) - 1, dtype=np.uint32)
+        self.min_counts = np.zeros(26, dtype=np.uint8)
+        self.max_counts = np.full(26, 5, dtype=np.uint8)
+
+    def add(self, guess, feedback):
+        shown = [0] * 26  # green and yellow copies of each letter in this guess
+        grays = []
+        for i, letter in enumerate(guess):
+            letter = ord(letter) - ord("a")
+            digit = feedback % 3
+            feedback //= 3
+            if digit == GREEN:
+                self.allowed[i] = 1 << letter
+            else:
+                self.allowed[i] &= ~np.uint32(1 << letter)
+            if digit == GRAY:
+                grays.append(letter)
+            else:
+                shown[letter] += 1
+        for letter, count in enumerate(shown):
+            if count > self.min_counts[letter]:
+                self.min_counts[letter] = count
+        for letter in grays:  # a gray copy means the secret has no more of the letter than were shown
+            if shown[letter] < self.max_counts[letter]:
+                self.max_counts[letter] = shown[letter]
+
+    def matches(self, letter_bits, letter_counts):
+        # Boolean array over words, given as rows of per-position letter bits and per-letter counts.
+        # only the letters some feedback has counted are compared, usually a handful of the 26 columns
+        counted = np.flatnonzero((self.min_counts > 0) | (self.max_counts < 5))
+        letter_counts = letter_counts[:, counted]
+        return (((letter_bits & self.allowed) != 0).all(axis=1) & (letter_counts >= self.min_counts[counted]).all(axis=1)
+                & (letter_counts <= self.max_counts[counted]).all(axis=1))
+
+def compile_letters(words):
+    # Per-position letter bits (1 << letter) and per-letter counts for each word, for LetterConstraints.matches.
+    letters = encode_words(words) - ord("a")
+    letter_counts = np.zeros((len(words), 26), dtype=np.uint8)
+    for i in range(5):
+        letter_counts[np.arange(len(words)), letters[:, i]] += 1
+    return np.left_shift(np.uint32(1), letters.astype(np.uint32)), letter_counts
+
 class Wordle:
-    def __init__(self, word_list):
+    def __init__(self, word_list, secret_word=None):
         self.word_list = word_list
-        self.secret_word = random.choice(self.word_list)
+        self.secret_word = random.choice(self.word_list) if secret_word is None else secret_word
         self.attempts = 6
         self.guesses = []
 
@@ -17,59 +165,90 @@ class Wordle:
         self.attempts -= 1
         self.guesses.append(word)
 
-        feedback = []
-        for i in range(5):
-            if word[i] == self.secret_word[i]:
-                feedback.append("Green")
-            elif word[i] in self.secret_word:
-                feedback.append("Yellow")
-            else:
-                feedback.append("Gray")
-        return feedback
+        return get_feedback(word, self.secret_word)
 
     def is_game_over(self):
         return self.attempts == 0 or (len(self.guesses) > 0 and self.guesses[-1] == self.secret_word)
 
 class WordleSolver:
-    def __init__(self, word_list):
+    def __init__(self, word_list, strategy="entropy"):
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown strategy: {strategy}")
         self.word_list = word_list
-        self.possible_words = self.word_list[:]
+        self.strategy = strategy
+        self.patterns = get_pattern_matrix(word_list)
+        self.word_indices = {word: i for i, word in enumerate(word_list)}
+        self.candidates = np.arange(len(word_list))  # indices of the words still possible
+        self.letter_bits, self.letter_counts = compile_letters(word_list)
+        self.constraints = LetterConstraints()  # everything the feedback so far has shown
+
+    @property
+    def possible_words(self):
+        return [self.word_list[i] for i in self.candidates]
 
-    def solve(self, game):
+    def solve(self, game, verbose=True):
+        # guess_seconds gets the solver's own time for each turn: choosing the guess plus filtering.
+        self.guess_seconds = []
         while not game.is_game_over():
+            start = time.perf_counter()
             best_guess = self.choose_best_guess()
-            print(f"Solver guesses: {best_guess}")
+            seconds = time.perf_counter() - start
+            if verbose:
+                print(f"Solver guesses: {best_guess}")
             feedback = game.guess(best_guess)
-            print(f"Feedback: {feedback}")
+            if verbose:
+                print(f"Feedback: {feedback_to_names(feedback)}")
+            start = time.perf_counter()
             self.filter_word_list(best_guess, feedback)
+            self.guess_seconds.append(seconds + time.perf_counter() - start)
             if best_guess == game.secret_word:
-                print("Solver found the word!")
+                if verbose:
+                    print("Solver found the word!")
                 return
 
     def choose_best_guess(self):
-        if not self.possible_words:
+        if not len(self.candidates):
             return random.choice(self.word_list)
-        return self.possible_words[0]
+        if self.strategy == "first" or len(self.candidates) <= 2:
+            return self.word_list[self.candidates[0]]
+        opening = len(self.candidates) == len(self.word_list)
+        if opening:
+            key = (word_list_key(self.word_list), self.strategy)
+            if key in opening_guesses:
+                return opening_guesses[key]
+        scores = score_guesses(self.patterns, self.candidates, self.strategy)
+        # Among equally good guesses, one that could itself be the answer is better.
+        best = np.flatnonzero(scores <= scores.min() + 1e-9)
+        possible = best[np.isin(best, self.candidates)]
+        guess = self.word_list[(possible if len(possible) else best)[0]]
+        if opening:
+            opening_guesses[key] = guess
+        return guess
 
     def filter_word_list(self, guess, feedback):
-        new_possible_words = []
-        for word in self.possible_words:
-            if self.is_word_possible(word, guess, feedback):
-                new_possible_words.append(word)
-        self.possible_words = new_possible_words
+        # A word stays possible only if it would have produced exactly the same feedback as the secret did.
+        # The pattern matrix answers that with one row lookup; guesses it doesn't cover go through the
+        # letter constraints, which select the same words.
+        self.constraints.add(guess, feedback)
+        if guess in self.word_indices:
+            row = self.patterns[self.word_indices[guess]]
+            self.candidates = self.candidates[row[self.candidates] == feedback]
+        else:
+            self.apply_constraints()
+
+    def filter_history(self, history):
+        # Catches up on several turns of (guess, feedback) at once, with a single pass over the candidates.
+        for guess, feedback in history:
+            self.constraints.add(guess, feedback)
+        self.apply_constraints()
+
+    def apply_constraints(self):
+        candidates = self.candidates
+        self.candidates = candidates[self.constraints.matches(self.letter_bits[candidates],
+                                                              self.letter_counts[candidates])]
 
     def is_word_possible(self, word, guess, feedback):
-        for i in range(5):
-            if feedback[i] == "Green" and word[i] != guess[i]:
-                return False
-            elif feedback[i] == "Yellow":
-                if word[i] == guess[i] or guess[i] not in word:
-                    return False
-            elif feedback[i] == "Gray" and guess[i] in word:
-                # Handle duplicate letters correctly
-                if word.count(guess[i]) != guess[:i].count(guess[i]):
-                    return False
-        return True
+        return get_feedback(guess, word) == feedback
 def load_word_list_from_url(url):
     """Loads a word list from a URL."""
     try:
@@ -105,7 +284,7 @@ def main():
         try:
             player_guess = input("Enter your guess: ").lower()
             feedback = game.guess(player_guess)
-            print(f"Feedback: {feedback}")
+            print(f"Feedback: {feedback if isinstance(feedback, str) else feedback_to_names(feedback)}")
             if player_guess == game.secret_word:
                 print(f"Congratulations! You guessed the word in {6 - game.attempts} attempts.")
                 break
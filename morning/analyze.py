@@ -0,0 +1,112 @@
+import argparse
+import collections
+import multiprocessing
+import os
+import sys
+import time
+
+import chess
+from chess import Board, Search, CHECKMATE, STALEMATE
+
+
+def read_epd(lines):
+    # Yields (position, operations) for each EPD record, skipping blank lines and # comments. Only the current
+    # line is held in memory, so files of any size stream through.
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        fields = line.split(None, 4)
+        yield " ".join(fields[:4]), fields[4] if len(fields) > 4 else ""
+
+
+def analyze_position(position, depth, max_time, max_nodes):
+    # Runs in a worker: searches one EPD position and returns (best move, score, nodes, depth, seconds).
+    # Scores are centipawns from the side to move's point of view, as EPD's ce expects.
+    board = Board(position + " 0 1")
+    chess.transposition_table.clear()  # so every position is analyzed the same way, whatever ran before it
+    start = time.perf_counter()
+    valid_moves = board.get_valid_moves()
+    if len(valid_moves) == 0:
+        return None, -CHECKMATE if board.in_check else STALEMATE, 0, 0, 0.0
+    search = Search(board, depth, max_time, max_nodes)
+    move = search.run(valid_moves)
+    return move.get_chess_notation(), search.best_score, search.nodes, search.completed_depth, \
+        time.perf_counter() - start
+
+
+def format_result(position, operations, result):
+    # EPD record with the analysis appended: acd/acn/acs (depth, nodes, seconds), ce (score) and pm (the
+    # predicted move, in the same coordinate notation as Move.get_chess_notation).
+    move, score, nodes, depth, elapsed = result
+    record = f"{position} {operations}".rstrip()
+    record += f" acd {depth}; acn {nodes}; acs {elapsed:.3f}; ce {score};"
+    if move is not None:
+        record += f" pm {move};"
+    return record
+
+
+def analyze_epd(lines, output, depth, max_time=None, max_nodes=None, workers=1):
+    # Streams the positions through a pool of workers and writes each result, in input order, as soon as it and
+    # every earlier one are done. At most a few tasks per worker are queued, so memory stays flat.
+    positions = 0
+    total_nodes = 0
+    start = time.perf_counter()
+
+    def write(position, operations, get_result):
+        nonlocal positions, total_nodes
+        try:
+            result = get_result()
+        except ValueError as error:  # a malformed position is reported and skipped
+            print(error, file=sys.stderr)
+            return
+        positions += 1
+        total_nodes += result[2]
+        output.write(format_result(position, operations, result) + "\n")
+        output.flush()
+
+    records = read_epd(lines)
+    if workers <= 1:
+        for position, operations in records:
+            write(position, operations, lambda: analyze_position(position, depth, max_time, max_nodes))
+    else:
+        with multiprocessing.Pool(workers) as pool:
+            pending = collections.deque()
+            for position, operations in records:
+                task = pool.apply_async(analyze_position, (position, depth, max_time, max_nodes))
+                pending.append((position, operations, task))
+                while pending and (len(pending) >= workers * 4 or pending[0][2].ready()):
+                    position, operations, task = pending.popleft()
+                    write(position, operations, task.get)
+            while pending:
+                position, operations, task = pending.popleft()
+                write(position, operations, task.get)
+    elapsed = time.perf_counter() - start
+    print(f"{positions} positions, {total_nodes} nodes in {elapsed:.3f}s "
+          f"({positions / max(elapsed, 1e-9):.2f} positions/s, {total_nodes / max(elapsed, 1e-9):,.0f} nodes/s)",
+          file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Search every position of an EPD file and write the results.")
+    parser.add_argument("epd", help="EPD file to analyze, or - for standard input")
+    parser.add_argument("-o", "--output", help="file to write the analyzed EPD to (defaults to standard output)")
+    parser.add_argument("--depth", type=int, default=Board().depth, help="search depth in plies")
+    parser.add_argument("--max-time", type=float, help="seconds per position")
+    parser.add_argument("--max-nodes", type=int, help="nodes per position")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="positions analyzed in parallel")
+    args = parser.parse_args()
+
+    lines = sys.stdin if args.epd == "-" else open(args.epd)
+    output = open(args.output, "w") if args.output else sys.stdout
+    try:
+        analyze_epd(lines, output, args.depth, args.max_time, args.max_nodes, args.workers)
+    finally:
+        if lines is not sys.stdin:
+            lines.close()
+        if output is not sys.stdout:
+            output.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+import argparse
+import array
+import os
+import sys
+import time
+
+from chess import (Board, KING_ATTACKS, PAWN_ATTACKS, WP, WR, WQ, BITBASE_DIRECTORY, BITBASE_PIECES, BITBASE_SIZE,
+                   BITBASE_WIN, bitbase_index, rook_attacks, bishop_attacks, probe_bitbase)
+
+
+def squares(bb):
+    while bb:
+        bit = bb & -bb
+        bb ^= bit
+        yield bit.bit_length() - 1
+
+
+def piece_attacks(piece, sq, occupied):
+    # Squares the strong side's piece attacks; the strong side is always white here.
+    if piece == WQ:
+        return rook_attacks(sq, occupied) | bishop_attacks(sq, occupied)
+    if piece == WR:
+        return rook_attacks(sq, occupied)
+    return PAWN_ATTACKS[0][sq]
+
+
+def generate(piece, promotion_tables=()):
+    # Retrograde analysis, returning one byte per position: 0 if the strong side can't force a win, else 1 + the
+    # plies to mate. Checkmates are 0 plies from mate; stalemates and positions where the bare king can take the
+    # piece are draws; a pawn promoting into a won position of promotion_tables is one ply further from mate than
+    # that position. Then the distances are filled in one ply at a time: the strong side to move is d plies from
+    # mate if its best move reaches a position d - 1 plies from it, the weak side if its longest defence does.
+    # Whatever is left undecided is a draw.
+    distances = bytearray(BITBASE_SIZE)
+    strong_positions = []  # (index, successor indices, stored distance after promoting or 0) still undecided
+    weak_positions = []
+    for strong_king in range(64):
+        for weak_king in range(64):
+            if weak_king == strong_king or KING_ATTACKS[strong_king] >> weak_king & 1:
+                continue
+            for piece_sq in range(64):
+                if piece_sq in (strong_king, weak_king) or piece == WP and (piece_sq < 8 or piece_sq >= 56):
+                    continue
+                occupied = 1 << strong_king | 1 << weak_king | 1 << piece_sq
+                attacks = piece_attacks(piece, piece_sq, occupied)
+
+                # strong side to move; the weak king can't be in check then
+                if not attacks >> weak_king & 1:
+                    index = bitbase_index(True, strong_king, weak_king, piece_sq)
+                    successors = array.array("I")
+                    promotion = 0
+                    for target in squares(KING_ATTACKS[strong_king] & ~KING_ATTACKS[weak_king] & ~(1 << piece_sq)):
+                        successors.append(bitbase_index(False, target, weak_king, piece_sq))
+                    if piece == WP:
+                        push = piece_sq - 8
+                        if not occupied >> push & 1:
+                            if push < 8:
+                                promoted = bitbase_index(False, strong_king, weak_king, push)
+                                promotion = min((table[promoted] + 1 for table in promotion_tables
+                                                 if table[promoted]), default=0)
+                            else:
+                                successors.append(bitbase_index(False, strong_king, weak_king, push))
+                                if piece_sq >= 48 and not occupied >> (push - 8) & 1:
+                                    successors.append(bitbase_index(False, strong_king, weak_king, push - 8))
+                    else:
+                        for target in squares(attacks & ~occupied):
+                            successors.append(bitbase_index(False, strong_king, weak_king, target))
+                    if successors or promotion:
+                        strong_positions.append((index, successors, promotion))
+
+                # weak side to move: a bare king's moves, where the piece's attacks see through the king's old square
+                index = bitbase_index(False, strong_king, weak_king, piece_sq)
+                covered = KING_ATTACKS[strong_king] | piece_attacks(piece, piece_sq, occupied ^ 1 << weak_king)
+                targets = KING_ATTACKS[weak_king] & ~covered
+                if targets >> piece_sq & 1:
+                    continue  # the piece can be taken: a draw
+                if not targets:
+                    if attacks >> weak_king & 1:
+                        distances[index] = 1  # checkmate
+                    continue
+                weak_positions.append((index, array.array("I", (bitbase_index(True, strong_king, target, piece_sq)
+                                                                for target in squares(targets)))))
+    # Wins with the strong side to move are an odd number of plies from mate and those with the weak side to move
+    # an even number, so each ply only looks at one side. A promotion can decide a position after a stretch where
+    # nothing changed, so the loop doesn't stop before the longest one.
+    last_promotion = max((promotion for _, _, promotion in strong_positions), default=0)
+    plies = 0
+    unchanged = 0
+    while unchanged < 2 or plies < last_promotion:
+        plies += 1
+        if plies > 254:
+            raise ValueError("Distance to mate doesn't fit in a byte")
+        changed = False
+        undecided = []
+        if plies % 2:
+            for position in strong_positions:
+                index, successors, promotion = position
+                if promotion == plies + 1 or any(distances[successor] == plies for successor in successors):
+                    distances[index] = plies + 1
+                    changed = True
+                else:
+                    undecided.append(position)
+            strong_positions = undecided
+        else:
+            for position in weak_positions:
+                index, successors = position
+                if all(distances[successor] for successor in successors):
+                    distances[index] = plies + 1
+                    changed = True
+                else:
+                    undecided.append(position)
+            weak_positions = undecided
+        unchanged = 0 if changed else unchanged + 1
+    return distances
+
+
+def build(directory):
+    # KQK and KRK first, since KPK's promotions look up their results.
+    tables = {}
+    for piece in (WQ, WR, WP):
+        name = BITBASE_PIECES[piece]
+        start = time.perf_counter()
+        distances = generate(piece, (tables[WQ], tables[WR]) if piece == WP else ())
+        tables[piece] = distances
+        with open(os.path.join(directory, name + ".bb"), "wb") as file:
+            file.write(distances)
+        print(f"{name}: {len(distances) - distances.count(0)} won positions, longest mate {max(distances) - 1} plies, "
+              f"{time.perf_counter() - start:.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate the KQK, KRK and KPK endgame bitbases.")
+    parser.add_argument("--directory", default=BITBASE_DIRECTORY, help="where to write the .bb files")
+    parser.add_argument("--probe", metavar="FEN", help="look a position up in the existing bitbases instead")
+    args = parser.parse_args()
+    if args.probe:
+        score = probe_bitbase(Board(args.probe))
+        if score is None:
+            sys.exit("No bitbase covers this position.")
+        if score == 0:
+            print("draw")
+        else:
+            print(f"{'win' if score > 0 else 'loss'} for the side to move, mate in {BITBASE_WIN - abs(score)} plies")
+    else:
+        build(args.directory)
+
+
+if __name__ == "__main__":
+    main()
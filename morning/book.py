@@ -0,0 +1,79 @@
+import argparse
+import collections
+import sys
+import time
+
+from chess import Board, OpeningBook, BOOK_ENTRY, OPENING_BOOK_PATH
+from pgn import read_games, replay, move_to_san
+
+# Weight a book move gets for each game it was played in, by the result for the side that played it.
+RESULT_WEIGHTS = {"win": 2, "draw": 1, "loss": 0}
+
+
+def build_book(pgn_paths, book_path, max_ply=16, min_games=1):
+    # Replays the first max_ply moves of every game and writes one entry per (position, move) seen in at least
+    # min_games games, weighted by how well the move scored. Games that fail to parse are skipped from the first
+    # bad move on.
+    counts = collections.Counter()
+    weights = collections.Counter()
+    games = 0
+    for path in pgn_paths:
+        with open(path) as lines:
+            for headers, san_moves in read_games(lines):
+                games += 1
+                result = headers.get("Result", "*")
+                try:
+                    for ply, (board, move) in enumerate(replay(headers, san_moves[:max_ply])):
+                        entry = (board.zobrist_key, move.value)
+                        counts[entry] += 1
+                        if result == "1/2-1/2":
+                            weights[entry] += RESULT_WEIGHTS["draw"]
+                        elif result in ("1-0", "0-1"):
+                            won = (result == "1-0") == board.white_to_move
+                            weights[entry] += RESULT_WEIGHTS["win" if won else "loss"]
+                except ValueError as error:
+                    print(f"{path}: game {games}: {error}", file=sys.stderr)
+    entries = sorted((key, value, weights[key, value]) for (key, value), count in counts.items()
+                     if count >= min_games and weights[key, value] > 0)
+    with open(book_path, "wb") as book:
+        for entry in entries:
+            book.write(BOOK_ENTRY.pack(*entry))
+    return games, len(entries)
+
+
+def probe(book_path, fen):
+    board = Board(fen)
+    valid_moves = board.get_valid_moves()
+    book = OpeningBook(book_path)
+    try:
+        weights = dict(book.entries(board.zobrist_key))
+    finally:
+        book.close()
+    total = sum(weights.values())
+    for move in sorted(valid_moves, key=lambda move: -weights.get(move.value, 0)):
+        if move.value in weights:
+            print(f"{move_to_san(move, valid_moves):8} {weights[move.value]:8} {100 * weights[move.value] / total:5.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or query the engine's opening book.")
+    parser.add_argument("--book", default=OPENING_BOOK_PATH, help="book file (defaults to book.bin next to chess.py)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="build a book from PGN files")
+    build.add_argument("pgn", nargs="+")
+    build.add_argument("--max-ply", type=int, default=16, help="how many plies of each game go into the book")
+    build.add_argument("--min-games", type=int, default=1, help="leave out moves played in fewer games")
+    query = commands.add_parser("probe", help="list the book moves of a position")
+    query.add_argument("--fen", default=Board().get_fen())
+    args = parser.parse_args()
+
+    if args.command == "build":
+        start = time.perf_counter()
+        games, entries = build_book(args.pgn, args.book, args.max_ply, args.min_games)
+        print(f"{games} games, {entries} entries written to {args.book} in {time.perf_counter() - start:.3f}s")
+    else:
+        probe(args.book, args.fen)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,444 +1,908 @@
 import random
-import copy
+import time
+import multiprocessing
+import mmap
+import os
+import struct
+from collections import namedtuple
+
+# Piece indices into Board.pieces; EMPTY marks an unoccupied square in Board.squares.
+WP, WN, WB, WR, WQ, WK, BP, BN, BB, BR, BQ, BK = range(12)
+EMPTY = 12
+PIECE_NAMES = ("wP", "wN", "wB", "wR", "wQ", "wK", "bP", "bN", "bB", "bR", "bQ", "bK", "--")
+
+# Squares are numbered row * 8 + col, so bit 0 is a8 and bit 63 is h1.
+FILE_A = 0x0101010101010101
+FILE_H = FILE_A << 7
+RANK_3 = 0xFF << 40
+RANK_6 = 0xFF << 16
+PROMOTION_RANKS = 0xFF | 0xFF << 56
+CASTLE_SQUARES = 1 << 2 | 1 << 6 | 1 << 58 | 1 << 62  # where a castling king lands
+FULL_BOARD = 0xFFFFFFFFFFFFFFFF
+NOT_FILE_A = FULL_BOARD & ~FILE_A
+NOT_FILE_H = FULL_BOARD & ~FILE_H
+
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+FEN_PIECES = {(name[1] if name[0] == "w" else name[1].lower()): i for i, name in enumerate(PIECE_NAMES[:12])}
+FEN_SYMBOLS = {i: symbol for symbol, i in FEN_PIECES.items()}
+PROMOTION_CHOICES = ("Q", "R", "B", "N")
+SQUARE_COORDINATES = [(sq >> 3, sq & 7) for sq in range(64)]
+# Castling rights, as bits of Board.castling.
+CASTLE_WKS, CASTLE_BKS, CASTLE_WQS, CASTLE_BQS = 1, 2, 4, 8
+# Rights kept when a move starts or ends on each square: touching a king or rook home square clears its rights.
+CASTLING_MASKS = [15] * 64
+CASTLING_MASKS[60] = 15 & ~(CASTLE_WKS | CASTLE_WQS)  # e1
+CASTLING_MASKS[63] = 15 & ~CASTLE_WKS  # h1
+CASTLING_MASKS[56] = 15 & ~CASTLE_WQS  # a1
+CASTLING_MASKS[4] = 15 & ~(CASTLE_BKS | CASTLE_BQS)  # e8
+CASTLING_MASKS[7] = 15 & ~CASTLE_BKS  # h8
+CASTLING_MASKS[0] = 15 & ~CASTLE_BQS  # a8
+# Board.state_stack entries: castling bits 0-3, en-passant square + 1 in bits 4-10, a null-move flag, the halfmove
+# clock and, above it, the Zobrist key.
+STATE_ENPASSANT_SHIFT = 4
+STATE_NULL_MOVE = 1 << 11
+STATE_HALFMOVE_SHIFT = 12
+STATE_HALFMOVE_MASK = (1 << 20) - 1
+STATE_KEY_SHIFT = 32
+STATE_STACK_SIZE = 1024  # grown by doubling if a game gets longer
+# Move kinds for Board.generate_moves.
+CAPTURES, QUIETS = 1, 2
+ALL_MOVES = CAPTURES | QUIETS
+
+ROOK_DIRECTIONS = ((-1, 0), (0, -1), (1, 0), (0, 1))
+BISHOP_DIRECTIONS = ((-1, -1), (-1, 1), (1, -1), (1, 1))
+DIRECTIONS = ROOK_DIRECTIONS + BISHOP_DIRECTIONS  # 0-3 orthogonal, 4-7 diagonal
+KNIGHT_OFFSETS = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1))
+KING_OFFSETS = DIRECTIONS
+
+
+def build_step_attacks(offsets):
+    # For each square, the bitboard of squares one (dr, dc) step away that are still on the board.
+    table = []
+    for sq in range(64):
+        r, c = sq >> 3, sq & 7
+        targets = 0
+        for dr, dc in offsets:
+            if 0 <= r + dr < 8 and 0 <= c + dc < 8:
+                targets |= 1 << ((r + dr) * 8 + c + dc)
+        table.append(targets)
+    return table
+
+
+def build_rays():
+    # For each direction and square, the bitboard of every square out to the edge of the board.
+    rays = []
+    for dr, dc in DIRECTIONS:
+        masks = []
+        for sq in range(64):
+            r, c = (sq >> 3) + dr, (sq & 7) + dc
+            mask = 0
+            while 0 <= r < 8 and 0 <= c < 8:
+                mask |= 1 << (r * 8 + c)
+                r, c = r + dr, c + dc
+            masks.append(mask)
+        rays.append(masks)
+    return rays
+
+
+def build_between(rays):
+    # The squares strictly between two squares that share a line, and nothing for squares that don't.
+    between = [[0] * 64 for _ in range(64)]
+    for direction in range(8):
+        for sq in range(64):
+            beyond = rays[direction][sq]
+            while beyond:
+                bit = beyond & -beyond
+                beyond ^= bit
+                target = bit.bit_length() - 1
+                between[sq][target] = rays[direction][sq] & ~rays[direction][target] & ~bit
+    return between
+
+
+# Attack tables, built once at import.
+KNIGHT_ATTACKS = build_step_attacks(KNIGHT_OFFSETS)
+KING_ATTACKS = build_step_attacks(KING_OFFSETS)
+PAWN_ATTACKS = [build_step_attacks(((-1, -1), (-1, 1))), build_step_attacks(((1, -1), (1, 1)))]  # white, black
+RAYS = build_rays()  # RAYS[direction][square]
+# Rays that run toward higher square numbers meet their nearest blocker at the lowest set bit, the others at the highest.
+RAY_IS_POSITIVE = [dr * 8 + dc > 0 for dr, dc in DIRECTIONS]
+BETWEEN = build_between(RAYS)  # BETWEEN[a][b]
+ROOK_RAYS = [RAYS[0][sq] | RAYS[1][sq] | RAYS[2][sq] | RAYS[3][sq] for sq in range(64)]
+BISHOP_RAYS = [RAYS[4][sq] | RAYS[5][sq] | RAYS[6][sq] | RAYS[7][sq] for sq in range(64)]
+
+
+def ray_attacks(sq, direction, occupied):
+    # Squares a slider on sq reaches in one direction, up to and including the first occupied square.
+    ray = RAYS[direction][sq]
+    blockers = ray & occupied
+    if blockers:
+        if RAY_IS_POSITIVE[direction]:
+            blocker = (blockers & -blockers).bit_length() - 1
+        else:
+            blocker = blockers.bit_length() - 1
+        ray ^= RAYS[direction][blocker]
+    return ray
+
+
+def rook_attacks(sq, occupied):
+    return ray_attacks(sq, 0, occupied) | ray_attacks(sq, 1, occupied) | \
+        ray_attacks(sq, 2, occupied) | ray_attacks(sq, 3, occupied)
+
+
+def bishop_attacks(sq, occupied):
+    return ray_attacks(sq, 4, occupied) | ray_attacks(sq, 5, occupied) | \
+        ray_attacks(sq, 6, occupied) | ray_attacks(sq, 7, occupied)
+
+
+# Material values in centipawns, and piece-square bonuses for white laid out rank 8 first like the board.
+piece_score = {"K": 0, "Q": 1000, "R": 500, "B": 300, "N": 300, "P": 100}
+piece_square_scores = {
+    "P": [
+        0, 0, 0, 0, 0, 0, 0, 0,
+        50, 50, 50, 50, 50, 50, 50, 50,
+        10, 10, 20, 30, 30, 20, 10, 10,
+        5, 5, 10, 25, 25, 10, 5, 5,
+        0, 0, 0, 20, 20, 0, 0, 0,
+        5, -5, -10, 0, 0, -10, -5, 5,
+        5, 10, 10, -20, -20, 10, 10, 5,
+        0, 0, 0, 0, 0, 0, 0, 0,
+    ],
+    "N": [
+        -50, -40, -30, -30, -30, -30, -40, -50,
+        -40, -20, 0, 0, 0, 0, -20, -40,
+        -30, 0, 10, 15, 15, 10, 0, -30,
+        -30, 5, 15, 20, 20, 15, 5, -30,
+        -30, 0, 15, 20, 20, 15, 0, -30,
+        -30, 5, 10, 15, 15, 10, 5, -30,
+        -40, -20, 0, 5, 5, 0, -20, -40,
+        -50, -40, -30, -30, -30, -30, -40, -50,
+    ],
+    "B": [
+        -20, -10, -10, -10, -10, -10, -10, -20,
+        -10, 0, 0, 0, 0, 0, 0, -10,
+        -10, 0, 5, 10, 10, 5, 0, -10,
+        -10, 5, 5, 10, 10, 5, 5, -10,
+        -10, 0, 10, 10, 10, 10, 0, -10,
+        -10, 10, 10, 10, 10, 10, 10, -10,
+        -10, 5, 0, 0, 0, 0, 5, -10,
+        -20, -10, -10, -10, -10, -10, -10, -20,
+    ],
+    "R": [
+        0, 0, 0, 0, 0, 0, 0, 0,
+        5, 10, 10, 10, 10, 10, 10, 5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        0, 0, 0, 5, 5, 0, 0, 0,
+    ],
+    "Q": [
+        -20, -10, -10, -5, -5, -10, -10, -20,
+        -10, 0, 0, 0, 0, 0, 0, -10,
+        -10, 0, 5, 5, 5, 5, 0, -10,
+        -5, 0, 5, 5, 5, 5, 0, -5,
+        0, 0, 5, 5, 5, 5, 0, -5,
+        -10, 5, 5, 5, 5, 5, 0, -10,
+        -10, 0, 5, 0, 0, 0, 0, -10,
+        -20, -10, -10, -5, -5, -10, -10, -20,
+    ],
+    "K": [
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -20, -30, -30, -40, -40, -30, -30, -20,
+        -10, -20, -20, -20, -20, -20, -20, -10,
+        20, 20, 0, 0, 0, 0, 20, 20,
+        20, 30, 10, 0, 0, 10, 30, 20,
+    ],
+}
+# Signed from white's point of view and indexed by piece index, so Board can add them up incrementally.
+PIECE_VALUES = [(1 if name[0] == "w" else -1) * piece_score[name[1]] for name in PIECE_NAMES[:12]]
+ORDER_VALUES = [abs(value) for value in PIECE_VALUES] + [0]  # unsigned, and 0 for EMPTY, for move ordering
+PIECE_SQUARE_VALUES = [[piece_square_scores[name[1]][sq] if name[0] == "w" else
+                        -piece_square_scores[name[1]][sq ^ 56] for sq in range(64)] for name in PIECE_NAMES[:12]]
+
+
+# Zobrist keys, from a fixed seed so the same position hashes the same in every process.
+zobrist_random = random.Random(20240917)
+ZOBRIST_PIECES = [zobrist_random.getrandbits(64) for _ in range(12 * 64)]  # indexed by piece * 64 + square
+ZOBRIST_BLACK_TO_MOVE = zobrist_random.getrandbits(64)
+ZOBRIST_CASTLING = [zobrist_random.getrandbits(64) for _ in range(16)]  # indexed by Board.castling
+ZOBRIST_ENPASSANT = [zobrist_random.getrandbits(64) for _ in range(8)]  # indexed by the en-passant file
+# The pawns' share of ZOBRIST_PIECES, zero for other pieces, so put_piece/remove_piece keep a pawn-only key branch-free.
+ZOBRIST_PAWNS = [key if index // 64 in (WP, BP) else 0 for index, key in enumerate(ZOBRIST_PIECES)]
+
+# Pawn-structure terms, in centipawns for the side that has them.
+DOUBLED_PAWN_PENALTY = 15  # for each pawn beyond the first on a file
+ISOLATED_PAWN_PENALTY = 15  # no friendly pawns on either neighbouring file
+PASSED_PAWN_BONUS = (0, 5, 10, 20, 35, 60, 100, 0)  # by rank counted from the pawn's own side, 1 = starting rank
+PAWN_SHIELD_BONUS = 10  # for each own pawn right in front of a king still on its first two ranks
+FILES = [FILE_A << c for c in range(8)]
+ADJACENT_FILES = [(FILES[c - 1] if c > 0 else 0) | (FILES[c + 1] if c < 7 else 0) for c in range(8)]
+ROWS_ABOVE = [(1 << (r * 8)) - 1 for r in range(8)]  # rows with a lower index, i.e. toward rank 8
+ROWS_BELOW = [FULL_BOARD & ~((1 << ((r + 1) * 8)) - 1) for r in range(8)]
+# PASSED_MASKS[color][sq]: squares ahead of a pawn on its own and neighbouring files; no enemy pawns there = passed.
+PASSED_MASKS = [[(FILES[sq & 7] | ADJACENT_FILES[sq & 7]) & rows[sq >> 3] for sq in range(64)]
+                for rows in (ROWS_ABOVE, ROWS_BELOW)]
+# SHIELD_MASKS[color][sq]: the three squares in front of a king on its first two ranks.
+SHIELD_MASKS = [[KING_ATTACKS[sq] & ~(1 << sq) & (ROWS_ABOVE if color == 0 else ROWS_BELOW)[sq >> 3]
+                 if (sq >> 3 in (6, 7) if color == 0 else sq >> 3 in (0, 1)) else 0 for sq in range(64)]
+                for color in (0, 1)]
+
 
 # Represents the chess board and game state.
 class Board:
-    def __init__(self):
-        self.board = [
-            ["bR", "bN", "bB", "bQ", "bK", "bB", "bN", "bR"],
-            ["bP", "bP", "bP", "bP", "bP", "bP", "bP", "bP"],
-            ["--", "--", "--", "--", "--", "--", "--", "--"],
-            ["--", "--", "--", "--", "--", "--", "--", "--"],
-            ["--", "--", "--", "--", "--", "--", "--", "--"],
-            ["--", "--", "--", "--", "--", "--", "--", "--"],
-            ["wP", "wP", "wP", "wP", "wP", "wP", "wP", "wP"],
-            ["wR", "wN", "wB", "wQ", "wK", "wB", "wN", "wR"],
-        ]
+    def __init__(self, fen=START_FEN):
         self.depth = 3
-        self.white_to_move = True
-        self.move_log = []
-        self.white_king_location = (7, 4)
-        self.black_king_location = (0, 4)
         self.in_check = False
         self.pins = []
         self.checks = []
-        self.enpassant_possible = ()  # coordinates for the square where en-passant is possible
-        self.current_castling_rights = CastleRights(True, True, True, True)
-        self.castle_rights_log = [CastleRights(self.current_castling_rights.wks, self.current_castling_rights.bks,
-                                             self.current_castling_rights.wqs, self.current_castling_rights.bqs)]
+        self.load_fen(fen)
+
+    def load_fen(self, fen):
+        # Sets up the position from the first four FEN fields: placement, side to move, castling and en passant.
+        fields = fen.split()
+        rows = fields[0].split("/") if fields else []
+        if len(fields) < 4 or len(rows) != 8 or fields[1] not in ("w", "b"):
+            raise ValueError(f"Invalid FEN: {fen!r}")
+        self.pieces = [0] * 12  # one bitboard per piece type and color
+        self.occupancy = [0, 0]  # white pieces, black pieces
+        self.occupied = 0
+        self.squares = [EMPTY] * 64  # piece index on each square, for O(1) lookups by square
+        self.zobrist_key = 0
+        self.pawn_key = 0  # hashes the pawns alone, for the pawn structure cache
+        self.material_score = 0  # centipawns, white minus black
+        self.position_score = 0  # piece-square table bonuses, white minus black
+        for r, row in enumerate(rows):
+            c = 0
+            for symbol in row:
+                if symbol.isdigit():
+                    c += int(symbol)
+                elif symbol in FEN_PIECES and c < 8:
+                    self.put_piece(FEN_PIECES[symbol], r * 8 + c)
+                    c += 1
+                else:
+                    raise ValueError(f"Invalid FEN: {fen!r}")
+            if c != 8:
+                raise ValueError(f"Invalid FEN: {fen!r}")
+        if self.pieces[WK].bit_count() != 1 or self.pieces[BK].bit_count() != 1:
+            raise ValueError(f"FEN must have exactly one king per side: {fen!r}")
+
+        self.white_to_move = fields[1] == "w"
+        self.move_log = []
+        self.castling = 0  # CASTLE_* bits
+        for symbol, right in (("K", CASTLE_WKS), ("k", CASTLE_BKS), ("Q", CASTLE_WQS), ("q", CASTLE_BQS)):
+            if symbol in fields[2]:
+                self.castling |= right
+        for right, king, king_sq, rook_sq in ((CASTLE_WKS, WK, 60, 63), (CASTLE_WQS, WK, 60, 56),
+                                              (CASTLE_BKS, BK, 4, 7), (CASTLE_BQS, BK, 4, 0)):
+            if self.squares[king_sq] != king or self.squares[rook_sq] != king - 2:
+                self.castling &= ~right  # a right the position can't have, e.g. from a sloppy FEN
+        enpassant = fields[3]
+        if enpassant == "-":
+            self.enpassant_possible = ()  # coordinates for the square where en-passant is possible
+        elif len(enpassant) == 2 and enpassant[0] in Move.files_to_cols and \
+                enpassant[1] == ("6" if self.white_to_move else "3"):
+            r, c = Move.ranks_to_rows[enpassant[1]], Move.files_to_cols[enpassant[0]]
+            # the pawn that just made the double push stands in front of the square, which it passed over
+            pushed = BP if self.white_to_move else WP
+            if self.squares[(r + 1 if self.white_to_move else r - 1) * 8 + c] != pushed or \
+                    self.squares[r * 8 + c] != EMPTY:
+                raise ValueError(f"Invalid FEN en passant square: {fen!r}")
+            self.enpassant_possible = (r, c)
+        else:
+            raise ValueError(f"Invalid FEN: {fen!r}")
+        # the move counters are optional, as in EPD
+        self.halfmove_clock = int(fields[4]) if len(fields) > 4 and fields[4].isdigit() else 0
+        self.first_fullmove = int(fields[5]) if len(fields) > 5 and fields[5].isdigit() else 1
+        # Irreversible state from before each move, packed by pack_state, so undo restores it exactly.
+        self.state_stack = [0] * STATE_STACK_SIZE
+        self.state_ply = 0
+        self.zobrist_key = self.compute_zobrist_key()
+
+    def get_fen(self):
+        # Inverse of load_fen.
+        rows = []
+        for r in range(8):
+            row = ""
+            empty = 0
+            for c in range(8):
+                piece = self.squares[r * 8 + c]
+                if piece == EMPTY:
+                    empty += 1
+                    continue
+                if empty:
+                    row += str(empty)
+                    empty = 0
+                row += FEN_SYMBOLS[piece]
+            rows.append(row + (str(empty) if empty else ""))
+        castling = "".join(symbol for symbol, right in (("K", CASTLE_WKS), ("Q", CASTLE_WQS), ("k", CASTLE_BKS),
+                                                        ("q", CASTLE_BQS)) if self.castling & right) or "-"
+        if self.enpassant_possible:
+            enpassant = Move.cols_to_files[self.enpassant_possible[1]] + Move.rows_to_ranks[self.enpassant_possible[0]]
+        else:
+            enpassant = "-"
+        black_started = self.white_to_move == (len(self.move_log) % 2 == 1)
+        fullmove = self.first_fullmove + (len(self.move_log) + black_started) // 2
+        return f"{'/'.join(rows)} {'w' if self.white_to_move else 'b'} {castling} {enpassant} " \
+               f"{self.halfmove_clock} {fullmove}"
+
+    @property
+    def current_castling_rights(self):
+        # A CastleRights view of the castling bits, for callers that want named flags.
+        castling = self.castling
+        return CastleRights(bool(castling & CASTLE_WKS), bool(castling & CASTLE_BKS), bool(castling & CASTLE_WQS),
+                            bool(castling & CASTLE_BQS))
+
+    def compute_zobrist_key(self):
+        # Hashes the position from scratch; make_move/undo_move keep self.zobrist_key up to date incrementally.
+        key = 0
+        for sq in range(64):
+            if self.squares[sq] != EMPTY:
+                key ^= ZOBRIST_PIECES[self.squares[sq] * 64 + sq]
+        if not self.white_to_move:
+            key ^= ZOBRIST_BLACK_TO_MOVE
+        return key ^ ZOBRIST_CASTLING[self.castling] ^ self.enpassant_key()
+
+    def compute_pawn_key(self):
+        key = 0
+        for sq in range(64):
+            key ^= ZOBRIST_PAWNS[self.squares[sq] * 64 + sq] if self.squares[sq] != EMPTY else 0
+        return key
+
+    def enpassant_key(self):
+        # The en-passant file is only hashed when a pawn can actually capture there, so the same position reached
+        # with or without a harmless double push (or loaded from a FEN that omits it) gets the same key.
+        if self.enpassant_possible:
+            r, c = self.enpassant_possible
+            pawns = self.pieces[WP if self.white_to_move else BP]
+            if PAWN_ATTACKS[self.white_to_move][r * 8 + c] & pawns:
+                return ZOBRIST_ENPASSANT[c]
+        return 0
+
+    def hash_enpassant_and_castling(self):
+        # XOR-ing these in before and after a change swaps the old state's keys for the new one's.
+        self.zobrist_key ^= ZOBRIST_CASTLING[self.castling] ^ self.enpassant_key()
+
+    def push_state(self, null_move=False):
+        # Packs castling rights, en passant, the halfmove clock and the hash into one int on the state stack.
+        if self.state_ply == len(self.state_stack):
+            self.state_stack.extend([0] * len(self.state_stack))
+        enpassant = self.enpassant_possible
+        self.state_stack[self.state_ply] = (self.castling | (enpassant[0] * 8 + enpassant[1] + 1 if enpassant else 0)
+                                            << STATE_ENPASSANT_SHIFT | (STATE_NULL_MOVE if null_move else 0)
+                                            | self.halfmove_clock << STATE_HALFMOVE_SHIFT
+                                            | self.zobrist_key << STATE_KEY_SHIFT)
+        self.state_ply += 1
+
+    def pop_state(self):
+        self.state_ply -= 1
+        state = self.state_stack[self.state_ply]
+        self.castling = state & 15
+        enpassant = state >> STATE_ENPASSANT_SHIFT & 127
+        self.enpassant_possible = SQUARE_COORDINATES[enpassant - 1] if enpassant else ()
+        self.halfmove_clock = state >> STATE_HALFMOVE_SHIFT & STATE_HALFMOVE_MASK
+        self.zobrist_key = state >> STATE_KEY_SHIFT
+
+    def is_repetition(self):
+        # True if this position, with the same side to move, already occurred since the last capture or pawn move.
+        key = self.zobrist_key
+        stack = self.state_stack
+        for ply in range(self.state_ply - 2, max(self.state_ply - self.halfmove_clock, 0) - 1, -2):
+            if stack[ply] >> STATE_KEY_SHIFT == key:
+                return True
+        return False
+
+    def last_move_was_null(self):
+        return self.state_ply > 0 and bool(self.state_stack[self.state_ply - 1] & STATE_NULL_MOVE)
+
+    @property
+    def board(self):
+        # The string grid is only built on demand, e.g. for print_board.
+        return [[PIECE_NAMES[self.squares[r * 8 + c]] for c in range(8)] for r in range(8)]
+
+    @property
+    def white_king_location(self):
+        sq = self.pieces[WK].bit_length() - 1
+        return (sq >> 3, sq & 7)
+
+    @property
+    def black_king_location(self):
+        sq = self.pieces[BK].bit_length() - 1
+        return (sq >> 3, sq & 7)
+
+    def put_piece(self, piece, sq):
+        bit = 1 << sq
+        self.pieces[piece] |= bit
+        self.occupancy[piece >= BP] |= bit
+        self.occupied |= bit
+        self.squares[sq] = piece
+        self.zobrist_key ^= ZOBRIST_PIECES[piece * 64 + sq]
+        self.pawn_key ^= ZOBRIST_PAWNS[piece * 64 + sq]
+        self.material_score += PIECE_VALUES[piece]
+        self.position_score += PIECE_SQUARE_VALUES[piece][sq]
+
+    def remove_piece(self, piece, sq):
+        bit = ~(1 << sq)
+        self.pieces[piece] &= bit
+        self.occupancy[piece >= BP] &= bit
+        self.occupied &= bit
+        self.squares[sq] = EMPTY
+        self.zobrist_key ^= ZOBRIST_PIECES[piece * 64 + sq]
+        self.pawn_key ^= ZOBRIST_PAWNS[piece * 64 + sq]
+        self.material_score -= PIECE_VALUES[piece]
+        self.position_score -= PIECE_SQUARE_VALUES[piece][sq]
 
     def make_move(self, move):
-        self.board[move.start_row][move.start_col] = "--"
-        self.board[move.end_row][move.end_col] = move.piece_moved
+        value = move.value
+        start = value & 63
+        end = value >> 6 & 63
+        moved = move.moved
+        captured = move.captured
+        self.push_state()
+        self.hash_enpassant_and_castling()
+        self.remove_piece(moved, start)
+        if value & MOVE_ENPASSANT:
+            self.remove_piece(captured, start & 56 | end & 7)  # the captured pawn is beside the start square
+        elif captured != EMPTY:
+            self.remove_piece(captured, end)
+        if value & MOVE_PROMOTION:
+            self.put_piece(moved + PROMOTION_OFFSETS[value >> PROMOTION_SHIFT & 3], end)
+        else:
+            self.put_piece(moved, end)
         self.move_log.append(move)
         self.white_to_move = not self.white_to_move
-        if move.piece_moved == "wK":
-            self.white_king_location = (move.end_row, move.end_col)
-        elif move.piece_moved == "bK":
-            self.black_king_location = (move.end_row, move.end_col)
+        self.zobrist_key ^= ZOBRIST_BLACK_TO_MOVE
 
-        if move.is_pawn_promotion:
-            self.board[move.end_row][move.end_col] = move.piece_moved[0] + "Q"
-
-        if move.is_enpassant_move:
-            self.board[move.start_row][move.end_col] = "--"
-
-        if move.piece_moved[1] == "P" and abs(move.start_row - move.end_row) == 2:
-            self.enpassant_possible = ((move.start_row + move.end_row) // 2, move.start_col)
+        if moved == WP or moved == BP:
+            self.halfmove_clock = 0
+            if abs(start - end) == 16:
+                self.enpassant_possible = SQUARE_COORDINATES[(start + end) >> 1]
+            else:
+                self.enpassant_possible = ()
         else:
+            self.halfmove_clock = 0 if captured != EMPTY else self.halfmove_clock + 1
             self.enpassant_possible = ()
 
-        if move.is_castle_move:
-            if move.end_col - move.start_col == 2:
-                self.board[move.end_row][move.end_col - 1] = self.board[move.end_row][move.end_col + 1]
-                self.board[move.end_row][move.end_col + 1] = "--"
+        if value & MOVE_CASTLE:
+            rook = WR if moved == WK else BR
+            if end > start:
+                self.remove_piece(rook, end + 1)
+                self.put_piece(rook, end - 1)
             else:
-                self.board[move.end_row][move.end_col + 1] = self.board[move.end_row][move.end_col - 2]
-                self.board[move.end_row][move.end_col - 2] = "--"
+                self.remove_piece(rook, end - 2)
+                self.put_piece(rook, end + 1)
 
         self.update_castle_rights(move)
-        self.castle_rights_log.append(CastleRights(self.current_castling_rights.wks, self.current_castling_rights.bks,
-                                                 self.current_castling_rights.wqs, self.current_castling_rights.bqs))
+        self.hash_enpassant_and_castling()
 
     def undo_move(self):
         if len(self.move_log) != 0:
             move = self.move_log.pop()
-            self.board[move.start_row][move.start_col] = move.piece_moved
-            self.board[move.end_row][move.end_col] = move.piece_captured
+            value = move.value
+            start = value & 63
+            end = value >> 6 & 63
+            self.remove_piece(self.squares[end], end)
+            self.put_piece(move.moved, start)
             self.white_to_move = not self.white_to_move
-            if move.piece_moved == "wK":
-                self.white_king_location = (move.start_row, move.start_col)
-            elif move.piece_moved == "bK":
-                self.black_king_location = (move.start_row, move.start_col)
 
-            if move.is_enpassant_move:
-                self.board[move.end_row][move.end_col] = "--"
-                self.board[move.start_row][move.end_col] = move.piece_captured
-                self.enpassant_possible = (move.end_row, move.end_col)
+            if value & MOVE_ENPASSANT:
+                self.put_piece(move.captured, start & 56 | end & 7)
+            elif move.captured != EMPTY:
+                self.put_piece(move.captured, end)
 
-            if move.piece_moved[1] == "P" and abs(move.start_row - move.end_row) == 2:
-                self.enpassant_possible = ()
+            if value & MOVE_CASTLE:
+                rook = WR if move.moved == WK else BR
+                if end > start:
+                    self.remove_piece(rook, end - 1)
+                    self.put_piece(rook, end + 1)
+                else:
+                    self.remove_piece(rook, end + 1)
+                    self.put_piece(rook, end - 2)
+            self.pop_state()  # castling, en passant, halfmove clock and the hash, exactly as they were
 
-            self.castle_rights_log.pop()
-            self.current_castling_rights = self.castle_rights_log[-1]
+    def make_null_move(self):
+        # Passes the turn, for null-move pruning. Must not be used while in check.
+        self.push_state(null_move=True)
+        self.hash_enpassant_and_castling()
+        self.enpassant_possible = ()
+        self.halfmove_clock += 1
+        self.white_to_move = not self.white_to_move
+        self.zobrist_key ^= ZOBRIST_BLACK_TO_MOVE
+        self.hash_enpassant_and_castling()
 
-            if move.is_castle_move:
-                if move.end_col - move.start_col == 2:
-                    self.board[move.end_row][move.end_col + 1] = self.board[move.end_row][move.end_col - 1]
-                    self.board[move.end_row][move.end_col - 1] = "--"
-                else:
-                    self.board[move.end_row][move.end_col - 2] = self.board[move.end_row][move.end_col + 1]
-                    self.board[move.end_row][move.end_col + 1] = "--"
+    def undo_null_move(self):
+        self.white_to_move = not self.white_to_move
+        self.pop_state()
 
     def update_castle_rights(self, move):
-        if move.piece_moved == "wK":
-            self.current_castling_rights.wks = False
-            self.current_castling_rights.wqs = False
-        elif move.piece_moved == "bK":
-            self.current_castling_rights.bks = False
-            self.current_castling_rights.bqs = False
-        elif move.piece_moved == "wR":
-            if move.start_row == 7:
-                if move.start_col == 0:
-                    self.current_castling_rights.wqs = False
-                elif move.start_col == 7:
-                    self.current_castling_rights.wks = False
-        elif move.piece_moved == "bR":
-            if move.start_row == 0:
-                if move.start_col == 0:
-                    self.current_castling_rights.bqs = False
-                elif move.start_col == 7:
-                    self.current_castling_rights.bks = False
+        # Moving the king or a rook off its home square, or capturing a rook on its home square, loses the right.
+        self.castling &= CASTLING_MASKS[move.value & 63] & CASTLING_MASKS[move.value >> 6 & 63]
 
     def get_valid_moves(self):
-        moves = []
         self.in_check, self.pins, self.checks = self.check_for_pins_and_checks()
-        if self.white_to_move:
-            king_row = self.white_king_location[0]
-            king_col = self.white_king_location[1]
-        else:
-            king_row = self.black_king_location[0]
-            king_col = self.black_king_location[1]
+        return self.generate_moves(ALL_MOVES)
+
+    def generate_moves(self, kinds):
+        # Legal moves of the given kinds (CAPTURES, QUIETS or ALL_MOVES). Expects in_check, pins and checks to
+        # be up to date for this position, so the search can generate a node's moves in separate stages.
         if self.in_check:
-            if len(self.checks) == 1:
-                moves = self.get_all_possible_moves()
-                check = self.checks[0]
-                check_row = check[0]
-                check_col = check[1]
-                piece_checking = self.board[check_row][check_col]
-                valid_squares = []
-                if piece_checking[1] == "N":
-                    valid_squares = [(check_row, check_col)]
-                else:
-                    for i in range(1, 8):
-                        valid_square = (king_row + check[2] * i, king_col + check[3] * i)
-                        valid_squares.append(valid_square)
-                        if valid_square[0] == check_row and valid_square[1] == check_col:
-                            break
-                for i in range(len(moves) - 1, -1, -1):
-                    if moves[i].piece_moved[1] != "K":
-                        if not (moves[i].end_row, moves[i].end_col) in valid_squares:
-                            moves.remove(moves[i])
-            else:
-                self.get_king_moves(king_row, king_col, moves)
+            return self.get_check_evasions(kinds)
+        return self.get_all_possible_moves(kinds)
+
+    def get_move_targets(self, kinds):
+        # Where moves of the given kinds may land, for pieces and for pawns. Captures include en passant and
+        # promotions by push; quiet moves include castling.
+        targets = 0
+        if kinds & CAPTURES:
+            targets |= self.occupancy[1 if self.white_to_move else 0]
+        if kinds & QUIETS:
+            targets |= ~self.occupied & FULL_BOARD
+        if kinds == CAPTURES:
+            return targets, targets | (~self.occupied & PROMOTION_RANKS)
+        if kinds == QUIETS:
+            return targets, targets & ~PROMOTION_RANKS
+        return targets, targets
+
+    def get_check_evasions(self, kinds=ALL_MOVES):
+        # Only generates moves that can answer the check: king moves, then (against a single checker)
+        # captures of the checker and interpositions on the checking ray by pieces that aren't pinned.
+        moves = []
+        if self.white_to_move:
+            offset = WP
         else:
-            moves = self.get_all_possible_moves()
+            offset = BP
+        targets, pawn_targets = self.get_move_targets(kinds)
+        king_sq = self.pieces[offset + 5].bit_length() - 1
+        self.get_king_moves(king_sq >> 3, king_sq & 7, moves, targets, include_castles=False)
+        if len(self.checks) > 1:
+            return moves  # double check, only the king can move
+        checker = self.checks[0][0] * 8 + self.checks[0][1]
+        evasions = BETWEEN[king_sq][checker] | (1 << checker)
+        pinned = 0
+        for pin in self.pins:
+            pinned |= 1 << (pin[0] * 8 + pin[1])  # a pinned piece can never block or capture a checker
+        self.get_unpinned_pawn_moves(self.pieces[offset] & ~pinned, moves, pawn_targets & evasions,
+                                     kinds & CAPTURES)
+        for bb, generator in ((self.pieces[offset + 1] & ~pinned, self.get_knight_moves),
+                              (self.pieces[offset + 2] & ~pinned, self.get_bishop_moves),
+                              (self.pieces[offset + 3] & ~pinned, self.get_rook_moves),
+                              (self.pieces[offset + 4] & ~pinned, self.get_queen_moves)):
+            while bb:
+                bit = bb & -bb
+                bb ^= bit
+                sq = bit.bit_length() - 1
+                generator(sq >> 3, sq & 7, moves, targets & evasions)
+        return moves
+
+    def find_legal_move(self, value):
+        # Returns the legal Move with this packed value (e.g. a hash or killer move from the search), or None.
+        # Only the piece on the start square is generated; in_check, pins and checks must be up to date.
+        for move in self.get_piece_moves(value & 63, 1 << (value >> 6 & 63)):
+            if move.value == value:
+                return move
+        return None
 
+    def get_piece_moves(self, start, targets=FULL_BOARD):
+        # Legal moves of the side to move's piece on start that land on targets. in_check, pins and checks must
+        # be up to date.
+        piece = self.squares[start]
+        offset = WP if self.white_to_move else BP
+        moves = []
+        if piece == EMPTY or (piece >= BP) != (offset == BP):
+            return moves
+        r, c = start >> 3, start & 7
+        if piece == offset + 5:
+            self.get_king_moves(r, c, moves, targets, include_castles=not self.in_check)
+        else:
+            if self.in_check:
+                if len(self.checks) > 1:
+                    return moves
+                king_sq = self.pieces[offset + 5].bit_length() - 1
+                checker = self.checks[0][0] * 8 + self.checks[0][1]
+                targets &= BETWEEN[king_sq][checker] | (1 << checker)
+            (self.get_pawn_moves, self.get_knight_moves, self.get_bishop_moves,
+             self.get_rook_moves, self.get_queen_moves)[piece - offset](r, c, moves, targets)
         return moves
 
     def is_in_check(self):
         if self.white_to_move:
-            return self.square_under_attack(self.white_king_location[0], self.white_king_location[1])
+            return self.square_under_attack(*self.white_king_location)
         else:
-            return self.square_under_attack(self.black_king_location[0], self.black_king_location[1])
+            return self.square_under_attack(*self.black_king_location)
 
     def square_under_attack(self, r, c):
-        enemy_color = 'b' if self.white_to_move else 'w'
-        ally_color = 'w' if self.white_to_move else 'b'
-        # check for pawn attacks
-        if self.white_to_move:
-            if r - 1 >= 0 and c - 1 >= 0 and self.board[r-1][c-1] == 'bP': return True
-            if r - 1 >= 0 and c + 1 < 8 and self.board[r-1][c+1] == 'bP': return True
-        else: # black to move
-            if r + 1 < 8 and c - 1 >= 0 and self.board[r+1][c-1] == 'wP': return True
-            if r + 1 < 8 and c + 1 < 8 and self.board[r+1][c+1] == 'wP': return True
-        # check for knight attacks
-        knight_moves = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1))
-        for move in knight_moves:
-            end_row, end_col = r + move[0], c + move[1]
-            if 0 <= end_row < 8 and 0 <= end_col < 8:
-                end_piece = self.board[end_row][end_col]
-                if end_piece[0] == enemy_color and end_piece[1] == 'N':
-                    return True
-        # check for rook, bishop, queen attacks
-        directions = ((-1, 0), (0, -1), (1, 0), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1))
-        for i, d in enumerate(directions):
-            for j in range(1, 8):
-                end_row, end_col = r + d[0] * j, c + d[1] * j
-                if 0 <= end_row < 8 and 0 <= end_col < 8:
-                    end_piece = self.board[end_row][end_col]
-                    if end_piece[0] == ally_color: # ally piece blocks
-                        break
-                    elif end_piece[0] == enemy_color:
-                        piece_type = end_piece[1]
-                        # orthogonally for rooks/queens, diagonally for bishops/queens
-                        if (0 <= i <= 3 and piece_type == 'R') or \
-                           (4 <= i <= 7 and piece_type == 'B') or \
-                           (piece_type == 'Q') or \
-                           (j == 1 and piece_type == 'K'):
-                            return True
-                        else: # enemy piece is not a threat in this direction
-                            break
-                else: # off board
-                    break
+        return self.is_square_attacked(r * 8 + c, not self.white_to_move, self.occupied)
+
+    def is_square_attacked(self, sq, by_white, occupied):
+        # occupied is a parameter so king moves can be tested with the king lifted off its square
+        enemy = WP if by_white else BP  # offset of the attacking side's pieces in self.pieces
+        # a white pawn attacks sq from where a black pawn on sq would attack, and vice versa
+        if PAWN_ATTACKS[by_white][sq] & self.pieces[enemy]: return True
+        if KNIGHT_ATTACKS[sq] & self.pieces[enemy + 1]: return True
+        if KING_ATTACKS[sq] & self.pieces[enemy + 5]: return True
+        queens = self.pieces[enemy + 4]
+        rooks = self.pieces[enemy + 3] | queens
+        if ROOK_RAYS[sq] & rooks and rook_attacks(sq, occupied) & rooks: return True
+        bishops = self.pieces[enemy + 2] | queens
+        if BISHOP_RAYS[sq] & bishops and bishop_attacks(sq, occupied) & bishops: return True
         return False
 
-    def get_all_possible_moves(self):
+    def attackers_to(self, sq, occupied):
+        # Bitboard of the pieces of both sides attacking sq, from the same tables as is_square_attacked.
+        pieces = self.pieces
+        queens = pieces[WQ] | pieces[BQ]
+        return (PAWN_ATTACKS[1][sq] & pieces[WP] | PAWN_ATTACKS[0][sq] & pieces[BP]
+                | KNIGHT_ATTACKS[sq] & (pieces[WN] | pieces[BN])
+                | KING_ATTACKS[sq] & (pieces[WK] | pieces[BK])
+                | rook_attacks(sq, occupied) & (pieces[WR] | pieces[BR] | queens)
+                | bishop_attacks(sq, occupied) & (pieces[WB] | pieces[BB] | queens)) & occupied
+
+    def static_exchange(self, move):
+        # Material the side to move expects to win from move and the recaptures on its end square, each side
+        # always recapturing with its least valuable piece and free to stop. Pins are ignored.
+        value = move.value
+        start = value & 63
+        end = value >> 6 & 63
+        occupied = self.occupied ^ (1 << start)
+        if value & MOVE_ENPASSANT:
+            occupied ^= 1 << ((start & ~7) | (end & 7))
+        gains = [capture_gain(move)]
+        on_square = ORDER_VALUES[move.promoted if value & MOVE_PROMOTION else move.moved]
+        white = not self.white_to_move
+        attackers = self.attackers_to(end, occupied)
+        while True:
+            own = attackers & self.occupancy[0 if white else 1]
+            if not own:
+                break
+            offset = WP if white else BP
+            for piece in range(offset, offset + 6):
+                bb = own & self.pieces[piece]
+                if bb:
+                    break
+            if piece == offset + 5 and attackers & ~own:
+                break  # the king can't capture onto a defended square
+            gains.append(on_square - gains[-1])
+            on_square = ORDER_VALUES[piece]
+            occupied ^= bb & -bb
+            attackers = self.attackers_to(end, occupied)  # picks up x-rays behind the piece that moved
+            white = not white
+        for i in range(len(gains) - 1, 0, -1):
+            gains[i - 1] = -max(-gains[i - 1], gains[i])
+        return gains[0]
+
+    def get_all_possible_moves(self, kinds=ALL_MOVES):
         moves = []
-        for r in range(len(self.board)):
-            for c in range(len(self.board[r])):
-                turn = self.board[r][c][0]
-                if (turn == "w" and self.white_to_move) or (turn == "b" and not self.white_to_move):
-                    piece = self.board[r][c][1]
-                    if piece == "P":
-                        self.get_pawn_moves(r, c, moves)
-                    elif piece == "R":
-                        self.get_rook_moves(r, c, moves)
-                    elif piece == "N":
-                        self.get_knight_moves(r, c, moves)
-                    elif piece == "B":
-                        self.get_bishop_moves(r, c, moves)
-                    elif piece == "Q":
-                        self.get_queen_moves(r, c, moves)
-                    elif piece == "K":
-                        self.get_king_moves(r, c, moves)
+        if self.white_to_move:
+            offset = WP
+        else:
+            offset = BP
+        targets, pawn_targets = self.get_move_targets(kinds)
+        pinned = 0
+        for pin in self.pins:
+            pinned |= 1 << (pin[0] * 8 + pin[1])
+        self.get_unpinned_pawn_moves(self.pieces[offset] & ~pinned, moves, pawn_targets, kinds & CAPTURES)
+        bb = self.pieces[offset] & pinned
+        while bb:
+            bit = bb & -bb
+            bb ^= bit
+            sq = bit.bit_length() - 1
+            self.get_pawn_moves(sq >> 3, sq & 7, moves, pawn_targets, kinds & CAPTURES)
+        for bb, generator in ((self.pieces[offset + 1], self.get_knight_moves),
+                              (self.pieces[offset + 2], self.get_bishop_moves),
+                              (self.pieces[offset + 3], self.get_rook_moves),
+                              (self.pieces[offset + 4], self.get_queen_moves)):
+            while bb:
+                bit = bb & -bb
+                bb ^= bit
+                sq = bit.bit_length() - 1
+                generator(sq >> 3, sq & 7, moves, targets)
+        king_sq = self.pieces[offset + 5].bit_length() - 1
+        self.get_king_moves(king_sq >> 3, king_sq & 7, moves, targets, include_castles=kinds & QUIETS)
         return moves
 
-    def get_pawn_moves(self, r, c, moves):
-        piece_pinned = False
-        pin_direction = ()
-        for i in range(len(self.pins) - 1, -1, -1):
-            if self.pins[i][0] == r and self.pins[i][1] == c:
-                piece_pinned = True
-                pin_direction = (self.pins[i][2], self.pins[i][3])
-                self.pins.remove(self.pins[i])
-                break
+    def get_pin_direction(self, r, c):
+        # Pins are left in place, since a node's moves may be generated in several stages.
+        for pin in self.pins:
+            if pin[0] == r and pin[1] == c:
+                return (pin[2], pin[3])
+        return ()
 
+    def get_unpinned_pawn_moves(self, pawns, moves, targets=FULL_BOARD, include_enpassant=True):
+        # Generates pushes and captures for a whole set of pawns at once with bitboard shifts.
+        # targets limits where pushes and captures may land; en passant is tested in full instead.
+        empty = ~self.occupied & targets
         if self.white_to_move:
-            if self.board[r - 1][c] == "--":
-                if not piece_pinned or pin_direction == (-1, 0):
-                    moves.append(Move((r, c), (r - 1, c), self.board))
-                    if r == 6 and self.board[r - 2][c] == "--":
-                        moves.append(Move((r, c), (r - 2, c), self.board))
-            if c - 1 >= 0:
-                if self.board[r - 1][c - 1][0] == "b":
-                    if not piece_pinned or pin_direction == (-1, -1):
-                        moves.append(Move((r, c), (r - 1, c - 1), self.board))
-                elif (r - 1, c - 1) == self.enpassant_possible:
-                    moves.append(Move((r, c), (r - 1, c - 1), self.board, is_enpassant_move=True))
-            if c + 1 <= 7:
-                if self.board[r - 1][c + 1][0] == "b":
-                    if not piece_pinned or pin_direction == (-1, 1):
-                        moves.append(Move((r, c), (r - 1, c + 1), self.board))
-                elif (r - 1, c + 1) == self.enpassant_possible:
-                    moves.append(Move((r, c), (r - 1, c + 1), self.board, is_enpassant_move=True))
+            forward, enemies = -8, self.occupancy[1] & targets
+            single = (pawns >> 8) & ~self.occupied
+            double = ((single & RANK_3) >> 8) & empty
+            single &= targets
+            left = ((pawns & NOT_FILE_A) >> 9)
+            right = ((pawns & NOT_FILE_H) >> 7)
         else:
-            if self.board[r + 1][c] == "--":
-                if not piece_pinned or pin_direction == (1, 0):
-                    moves.append(Move((r, c), (r + 1, c), self.board))
-                    if r == 1 and self.board[r + 2][c] == "--":
-                        moves.append(Move((r, c), (r + 2, c), self.board))
-            if c - 1 >= 0:
-                if self.board[r + 1][c - 1][0] == "w":
-                    if not piece_pinned or pin_direction == (1, -1):
-                        moves.append(Move((r, c), (r + 1, c - 1), self.board))
-                elif (r + 1, c - 1) == self.enpassant_possible:
-                    moves.append(Move((r, c), (r + 1, c - 1), self.board, is_enpassant_move=True))
-            if c + 1 <= 7:
-                if self.board[r + 1][c + 1][0] == "w":
-                    if not piece_pinned or pin_direction == (1, 1):
-                        moves.append(Move((r, c), (r + 1, c + 1), self.board))
-                elif (r + 1, c + 1) == self.enpassant_possible:
-                    moves.append(Move((r, c), (r + 1, c + 1), self.board, is_enpassant_move=True))
-
-    def get_rook_moves(self, r, c, moves):
-        piece_pinned = False
-        pin_direction = ()
-        for i in range(len(self.pins) - 1, -1, -1):
-            if self.pins[i][0] == r and self.pins[i][1] == c:
-                piece_pinned = True
-                pin_direction = (self.pins[i][2], self.pins[i][3])
-                if self.board[r][c][1] != "Q":
-                    self.pins.remove(self.pins[i])
-                break
-        directions = ((-1, 0), (0, -1), (1, 0), (0, 1))
-        enemy_color = "b" if self.white_to_move else "w"
-        for d in directions:
-            for i in range(1, 8):
-                end_row = r + d[0] * i
-                end_col = c + d[1] * i
-                if 0 <= end_row < 8 and 0 <= end_col < 8:
-                    if not piece_pinned or pin_direction == d or pin_direction == (-d[0], -d[1]):
-                        end_piece = self.board[end_row][end_col]
-                        if end_piece == "--":
-                            moves.append(Move((r, c), (end_row, end_col), self.board))
-                        elif end_piece[0] == enemy_color:
-                            moves.append(Move((r, c), (end_row, end_col), self.board))
-                            break
-                        else:
-                            break
-                else:
-                    break
+            forward, enemies = 8, self.occupancy[0] & targets
+            single = (pawns << 8) & ~self.occupied & FULL_BOARD
+            double = ((single & RANK_6) << 8) & empty
+            single &= targets
+            left = ((pawns & NOT_FILE_A) << 7)
+            right = ((pawns & NOT_FILE_H) << 9)
+        ep_bit = 0
+        if self.enpassant_possible and include_enpassant:
+            ep_bit = 1 << (self.enpassant_possible[0] * 8 + self.enpassant_possible[1])
+        for targets, step, is_enpassant_move in ((single, forward, False), (double, 2 * forward, False),
+                                                 (left & enemies, forward - 1, False),
+                                                 (right & enemies, forward + 1, False),
+                                                 (left & ep_bit, forward - 1, True),
+                                                 (right & ep_bit, forward + 1, True)):
+            while targets:
+                bit = targets & -targets
+                targets ^= bit
+                end = bit.bit_length() - 1
+                self.add_pawn_move(end - step, end, moves, is_enpassant_move)
 
-    def get_knight_moves(self, r, c, moves):
-        piece_pinned = False
-        for i in range(len(self.pins) - 1, -1, -1):
-            if self.pins[i][0] == r and self.pins[i][1] == c:
-                piece_pinned = True
-                self.pins.remove(self.pins[i])
-                break
-        knight_moves = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1))
-        ally_color = "w" if self.white_to_move else "b"
-        for m in knight_moves:
-            end_row = r + m[0]
-            end_col = c + m[1]
-            if 0 <= end_row < 8 and 0 <= end_col < 8:
-                if not piece_pinned:
-                    end_piece = self.board[end_row][end_col]
-                    if end_piece[0] != ally_color:
-                        moves.append(Move((r, c), (end_row, end_col), self.board))
-
-    def get_bishop_moves(self, r, c, moves):
-        piece_pinned = False
-        pin_direction = ()
-        for i in range(len(self.pins) - 1, -1, -1):
-            if self.pins[i][0] == r and self.pins[i][1] == c:
-                piece_pinned = True
-                pin_direction = (self.pins[i][2], self.pins[i][3])
-                self.pins.remove(self.pins[i]) # queen or bishop, can be removed
-                break
-        directions = ((-1, -1), (-1, 1), (1, -1), (1, 1))
-        enemy_color = "b" if self.white_to_move else "w"
-        for d in directions:
-            for i in range(1, 8):
-                end_row = r + d[0] * i
-                end_col = c + d[1] * i
-                if 0 <= end_row < 8 and 0 <= end_col < 8:
-                    if not piece_pinned or pin_direction == d or pin_direction == (-d[0], -d[1]):
-                        end_piece = self.board[end_row][end_col]
-                        if end_piece == "--":
-                            moves.append(Move((r, c), (end_row, end_col), self.board))
-                        elif end_piece[0] == enemy_color:
-                            moves.append(Move((r, c), (end_row, end_col), self.board))
-                            break
-                        else:
-                            break
-                else:
-                    break
+    def add_pawn_move(self, start, end, moves, is_enpassant_move=False):
+        pawn = self.squares[start]
+        if end < 8 or end >= 56:
+            for i in range(4):
+                moves.append(Move.packed(start | end << 6 | MOVE_PROMOTION | i << PROMOTION_SHIFT, pawn,
+                                         self.squares[end]))
+        elif not is_enpassant_move:
+            moves.append(Move.packed(start | end << 6, pawn, self.squares[end]))
+        else:
+            move = Move.packed(start | end << 6 | MOVE_ENPASSANT, pawn, BP if pawn == WP else WP)
+            if self.is_legal_enpassant(move):
+                moves.append(move)
 
-    def get_queen_moves(self, r, c, moves):
-        self.get_rook_moves(r, c, moves)
-        self.get_bishop_moves(r, c, moves)
-
-    def get_king_moves(self, r, c, moves):
-        row_moves = (-1, -1, -1, 0, 0, 1, 1, 1)
-        col_moves = (-1, 0, 1, -1, 1, -1, 0, 1)
-        ally_color = "w" if self.white_to_move else "b"
-        for i in range(8):
-            end_row = r + row_moves[i]
-            end_col = c + col_moves[i]
-            if 0 <= end_row < 8 and 0 <= end_col < 8:
-                end_piece = self.board[end_row][end_col]
-                if end_piece[0] != ally_color:
-                    if ally_color == "w":
-                        self.white_king_location = (end_row, end_col)
-                    else:
-                        self.black_king_location = (end_row, end_col)
-                    in_check, pins, checks = self.check_for_pins_and_checks()
-                    if not in_check:
-                        moves.append(Move((r, c), (end_row, end_col), self.board))
-                    if ally_color == "w":
-                        self.white_king_location = (r, c)
-                    else:
-                        self.black_king_location = (r, c)
-        self.get_castle_moves(r, c, moves, ally_color)
+    def is_legal_enpassant(self, move):
+        # The capture takes two pawns off one rank at once, which the pin scan can't see, so just try it.
+        self.make_move(move)
+        self.white_to_move = not self.white_to_move
+        exposed = self.is_in_check()
+        self.white_to_move = not self.white_to_move
+        self.undo_move()
+        return not exposed
+
+    def get_pawn_moves(self, r, c, moves, targets=FULL_BOARD, include_enpassant=True):
+        pin_direction = self.get_pin_direction(r, c)
+        sq = r * 8 + c
+        if self.white_to_move:
+            forward, start_row, enemies = -1, 6, self.occupancy[1]
+        else:
+            forward, start_row, enemies = 1, 1, self.occupancy[0]
+        one_step = sq + forward * 8
+        if not self.occupied >> one_step & 1:
+            # a pawn pinned along its file may still push, whether the king is behind it or in front of it
+            if not pin_direction or pin_direction in ((forward, 0), (-forward, 0)):
+                if targets >> one_step & 1:
+                    self.add_pawn_move(sq, one_step, moves)
+                two_steps = one_step + forward * 8
+                if r == start_row and not self.occupied >> two_steps & 1 and targets >> two_steps & 1:
+                    self.add_pawn_move(sq, two_steps, moves)
+        for dc in (-1, 1):
+            if 0 <= c + dc <= 7:
+                if enemies >> (one_step + dc) & 1:
+                    if (not pin_direction or pin_direction in ((forward, dc), (-forward, -dc))) and \
+                            targets >> (one_step + dc) & 1:
+                        self.add_pawn_move(sq, one_step + dc, moves)
+                elif (r + forward, c + dc) == self.enpassant_possible and include_enpassant:
+                    self.add_pawn_move(sq, one_step + dc, moves, is_enpassant_move=True)
+
+    def get_slider_moves(self, r, c, moves, first_direction, pin_direction, targets):
+        sq = r * 8 + c
+        reachable = 0
+        for d in range(first_direction, first_direction + 4):
+            dr, dc = DIRECTIONS[d]
+            if not pin_direction or pin_direction == (dr, dc) or pin_direction == (-dr, -dc):
+                reachable |= ray_attacks(sq, d, self.occupied)
+        targets &= reachable & ~self.occupancy[0 if self.white_to_move else 1]
+        piece = self.squares[sq]
+        while targets:
+            bit = targets & -targets
+            targets ^= bit
+            end = bit.bit_length() - 1
+            moves.append(Move.packed(sq | end << 6, piece, self.squares[end]))
+
+    def get_rook_moves(self, r, c, moves, targets=FULL_BOARD):
+        pin_direction = self.get_pin_direction(r, c)
+        self.get_slider_moves(r, c, moves, 0, pin_direction, targets)
+
+    def get_knight_moves(self, r, c, moves, targets=FULL_BOARD):
+        if self.get_pin_direction(r, c):
+            return
+        sq = r * 8 + c
+        own = self.occupancy[0 if self.white_to_move else 1]
+        targets &= KNIGHT_ATTACKS[sq] & ~own
+        knight = self.squares[sq]
+        while targets:
+            bit = targets & -targets
+            targets ^= bit
+            end = bit.bit_length() - 1
+            moves.append(Move.packed(sq | end << 6, knight, self.squares[end]))
+
+    def get_bishop_moves(self, r, c, moves, targets=FULL_BOARD):
+        pin_direction = self.get_pin_direction(r, c)
+        self.get_slider_moves(r, c, moves, 4, pin_direction, targets)
+
+    def get_queen_moves(self, r, c, moves, targets=FULL_BOARD):
+        self.get_rook_moves(r, c, moves, targets)
+        self.get_bishop_moves(r, c, moves, targets)
 
-    def get_castle_moves(self, r, c, moves, ally_color):
+    def get_king_moves(self, r, c, moves, targets=FULL_BOARD, include_castles=True):
+        sq = r * 8 + c
+        own = self.occupancy[0 if self.white_to_move else 1]
+        # Lift the king off the board, so squares behind it along a checking line still count as attacked.
+        occupied = self.occupied ^ (1 << sq)
+        castle_targets = targets
+        targets &= KING_ATTACKS[sq] & ~own
+        king = self.squares[sq]
+        while targets:
+            bit = targets & -targets
+            targets ^= bit
+            end = bit.bit_length() - 1
+            if not self.is_square_attacked(end, not self.white_to_move, occupied):
+                moves.append(Move.packed(sq | end << 6, king, self.squares[end]))
+        if include_castles and castle_targets & CASTLE_SQUARES:
+            self.get_castle_moves(r, c, moves)
+
+    def get_castle_moves(self, r, c, moves):
         if self.square_under_attack(r, c):
             return
-        if (self.white_to_move and self.current_castling_rights.wks) or (
-                not self.white_to_move and self.current_castling_rights.bks):
-            self.get_kingside_castle_moves(r, c, moves, ally_color)
-        if (self.white_to_move and self.current_castling_rights.wqs) or (
-                not self.white_to_move and self.current_castling_rights.bqs):
-            self.get_queenside_castle_moves(r, c, moves, ally_color)
-
-    def get_kingside_castle_moves(self, r, c, moves, ally_color):
-        if self.board[r][c + 1] == "--" and self.board[r][c + 2] == "--":
+        if self.castling & (CASTLE_WKS if self.white_to_move else CASTLE_BKS):
+            self.get_kingside_castle_moves(r, c, moves)
+        if self.castling & (CASTLE_WQS if self.white_to_move else CASTLE_BQS):
+            self.get_queenside_castle_moves(r, c, moves)
+
+    def get_kingside_castle_moves(self, r, c, moves):
+        sq = r * 8 + c
+        if not self.occupied & (0b11 << (sq + 1)):
             if not self.square_under_attack(r, c + 1) and not self.square_under_attack(r, c + 2):
-                moves.append(Move((r, c), (r, c + 2), self.board, is_castle_move=True))
+                moves.append(Move.packed(sq | (sq + 2) << 6 | MOVE_CASTLE, self.squares[sq], EMPTY))
 
-    def get_queenside_castle_moves(self, r, c, moves, ally_color):
-        if self.board[r][c - 1] == "--" and self.board[r][c - 2] == "--" and self.board[r][c - 3] == "--":
+    def get_queenside_castle_moves(self, r, c, moves):
+        sq = r * 8 + c
+        if not self.occupied & (0b111 << (sq - 3)):
             if not self.square_under_attack(r, c - 1) and not self.square_under_attack(r, c - 2):
-                moves.append(Move((r, c), (r, c - 2), self.board, is_castle_move=True))
+                moves.append(Move.packed(sq | (sq - 2) << 6 | MOVE_CASTLE, self.squares[sq], EMPTY))
 
     def check_for_pins_and_checks(self):
         pins = []
         checks = []
-        in_check = False
         if self.white_to_move:
-            enemy_color = "b"
-            ally_color = "w"
-            start_row = self.white_king_location[0]
-            start_col = self.white_king_location[1]
+            enemy, own = BP, self.occupancy[0]
+            king_sq = self.pieces[WK].bit_length() - 1
         else:
-            enemy_color = "w"
-            ally_color = "b"
-            start_row = self.black_king_location[0]
-            start_col = self.black_king_location[1]
-        directions = ((-1, 0), (0, -1), (1, 0), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1))
-        for j in range(len(directions)):
-            d = directions[j]
-            possible_pin = ()
-            for i in range(1, 8):
-                end_row = start_row + d[0] * i
-                end_col = start_col + d[1] * i
-                if 0 <= end_row < 8 and 0 <= end_col < 8:
-                    end_piece = self.board[end_row][end_col]
-                    if end_piece[0] == ally_color and end_piece[1] != "K":
-                        if possible_pin == ():
-                            possible_pin = (end_row, end_col, d[0], d[1])
-                        else:
-                            break
-                    elif end_piece[0] == enemy_color:
-                        type = end_piece[1]
-                        if (0 <= j <= 3 and type == "R") or \
-                                (4 <= j <= 7 and type == "B") or \
-                                (i == 1 and type == "P" and (
-                                        (enemy_color == "w" and 6 <= j <= 7) or (enemy_color == "b" and 4 <= j <= 5))) or \
-                                (type == "Q") or (i == 1 and type == "K"):
-                            if possible_pin == ():
-                                in_check = True
-                                checks.append((end_row, end_col, d[0], d[1]))
-                                break
-                            else:
-                                pins.append(possible_pin)
-                                break
-                        else:
-                            break
-                else:
-                    break
-        knight_moves = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1))
-        for m in knight_moves:
-            end_row = start_row + m[0]
-            end_col = start_col + m[1]
-            if 0 <= end_row < 8 and 0 <= end_col < 8:
-                end_piece = self.board[end_row][end_col]
-                if end_piece[0] == enemy_color and end_piece[1] == "N":
-                    in_check = True
-                    checks.append((end_row, end_col, m[0], m[1]))
-        return in_check, pins, checks
+            enemy, own = WP, self.occupancy[1]
+            king_sq = self.pieces[BK].bit_length() - 1
+        start_row, start_col = king_sq >> 3, king_sq & 7
+        queens = self.pieces[enemy + 4]
+        rooks = self.pieces[enemy + 3] | queens
+        bishops = self.pieces[enemy + 2] | queens
+        for d in range(8):
+            sliders = rooks if d < 4 else bishops
+            if not RAYS[d][king_sq] & sliders:
+                continue
+            # the nearest piece along the ray either checks the king or, if it's ours, may be pinned to it
+            blockers = RAYS[d][king_sq] & self.occupied
+            first = (blockers & -blockers).bit_length() - 1 if RAY_IS_POSITIVE[d] else blockers.bit_length() - 1
+            if sliders >> first & 1:
+                checks.append((first >> 3, first & 7, DIRECTIONS[d][0], DIRECTIONS[d][1]))
+            elif own >> first & 1:
+                beyond = blockers & RAYS[d][first]
+                if beyond:
+                    second = (beyond & -beyond).bit_length() - 1 if RAY_IS_POSITIVE[d] else beyond.bit_length() - 1
+                    if sliders >> second & 1:
+                        pins.append((first >> 3, first & 7, DIRECTIONS[d][0], DIRECTIONS[d][1]))
+        # enemy pawns check from where one of our pawns on the king's square would attack
+        for attackers in (PAWN_ATTACKS[not self.white_to_move][king_sq] & self.pieces[enemy],
+                          KNIGHT_ATTACKS[king_sq] & self.pieces[enemy + 1]):
+            while attackers:
+                bit = attackers & -attackers
+                attackers ^= bit
+                end = bit.bit_length() - 1
+                checks.append((end >> 3, end & 7, (end >> 3) - start_row, (end & 7) - start_col))
+        return len(checks) > 0, pins, checks
 
 
 class CastleRights:
@@ -449,90 +913,854 @@ class CastleRights:
         self.bqs = bqs
 
 
+# Moves are packed into one int: bits 0-5 start square, 6-11 end square, then flags and the promotion choice.
+MOVE_ENPASSANT = 1 << 12
+MOVE_CASTLE = 1 << 13
+MOVE_PROMOTION = 1 << 14
+PROMOTION_SHIFT = 15  # two bits indexing PROMOTION_CHOICES
+PROMOTION_OFFSETS = (4, 3, 2, 1)  # pawn index + offset is the piece each of PROMOTION_CHOICES promotes to
+
+
 class Move:
+    __slots__ = ("value", "moved", "captured")
     ranks_to_rows = {"1": 7, "2": 6, "3": 5, "4": 4, "5": 3, "6": 2, "7": 1, "8": 0}
     rows_to_ranks = {v: k for k, v in ranks_to_rows.items()}
     files_to_cols = {"a": 0, "b": 1, "c": 2, "d": 3, "e": 4, "f": 5, "g": 6, "h": 7}
     cols_to_files = {v: k for k, v in files_to_cols.items()}
 
-    def __init__(self, start_sq, end_sq, board, is_enpassant_move=False, is_castle_move=False):
-        self.start_row = start_sq[0]
-        self.start_col = start_sq[1]
-        self.end_row = end_sq[0]
-        self.end_col = end_sq[1]
-        self.piece_moved = board[self.start_row][self.start_col]
-        self.piece_captured = board[self.end_row][self.end_col]
-        self.is_pawn_promotion = (self.piece_moved == "wP" and self.end_row == 0) or \
-                                 (self.piece_moved == "bP" and self.end_row == 7)
-        self.is_enpassant_move = is_enpassant_move
-        if self.is_enpassant_move:
-            self.piece_captured = "wP" if self.piece_moved == "bP" else "bP"
-        self.is_castle_move = is_castle_move
-        self.move_id = self.start_row * 1000 + self.start_col * 100 + self.end_row * 10 + self.end_col
+    # board is Board.squares, the piece index on each of the 64 squares
+    def __init__(self, start_sq, end_sq, board, is_enpassant_move=False, is_castle_move=False, promotion_choice="Q"):
+        start = start_sq[0] * 8 + start_sq[1]
+        end = end_sq[0] * 8 + end_sq[1]
+        self.moved = board[start]
+        self.captured = board[end]
+        value = start | end << 6
+        if is_enpassant_move:
+            value |= MOVE_ENPASSANT
+            self.captured = WP if self.moved == BP else BP
+        if is_castle_move:
+            value |= MOVE_CASTLE
+        if (self.moved == WP and end_sq[0] == 0) or (self.moved == BP and end_sq[0] == 7):
+            value |= MOVE_PROMOTION | PROMOTION_CHOICES.index(promotion_choice) << PROMOTION_SHIFT
+        self.value = value
+
+    @classmethod
+    def packed(cls, value, moved, captured):
+        # Cheap constructor for the move generators, which already know the packed value and both pieces.
+        move = cls.__new__(cls)
+        move.value = value
+        move.moved = moved
+        move.captured = captured
+        return move
+
+    @property
+    def start(self):
+        return self.value & 63
+
+    @property
+    def end(self):
+        return self.value >> 6 & 63
+
+    @property
+    def start_row(self):
+        return self.value >> 3 & 7
+
+    @property
+    def start_col(self):
+        return self.value & 7
+
+    @property
+    def end_row(self):
+        return self.value >> 9 & 7
+
+    @property
+    def end_col(self):
+        return self.value >> 6 & 7
+
+    @property
+    def piece_moved(self):
+        return PIECE_NAMES[self.moved]
+
+    @property
+    def piece_captured(self):
+        return PIECE_NAMES[self.captured]
+
+    @property
+    def is_pawn_promotion(self):
+        return bool(self.value & MOVE_PROMOTION)
+
+    @property
+    def is_enpassant_move(self):
+        return bool(self.value & MOVE_ENPASSANT)
+
+    @property
+    def is_castle_move(self):
+        return bool(self.value & MOVE_CASTLE)
+
+    @property
+    def promotion_choice(self):
+        return PROMOTION_CHOICES[self.value >> PROMOTION_SHIFT & 3] if self.value & MOVE_PROMOTION else None
+
+    @property
+    def promoted(self):
+        return self.moved + PROMOTION_OFFSETS[self.value >> PROMOTION_SHIFT & 3] if self.value & MOVE_PROMOTION else None
+
+    @property
+    def move_id(self):
+        return self.value
 
     def __eq__(self, other):
         if isinstance(other, Move):
-            return self.move_id == other.move_id
+            return self.value == other.value
         return False
 
+    def __hash__(self):
+        return hash(self.value)
+
+    def __repr__(self):
+        return f"Move({self.get_chess_notation()})"
+
     def get_chess_notation(self):
-        return self.get_rank_file(self.start_row, self.start_col) + self.get_rank_file(self.end_row, self.end_col)
+        notation = self.get_rank_file(self.start_row, self.start_col) + self.get_rank_file(self.end_row, self.end_col)
+        if self.is_pawn_promotion:
+            notation += self.promotion_choice.lower()
+        return notation
 
     def get_rank_file(self, r, c):
         return self.cols_to_files[c] + self.rows_to_ranks[r]
 
 
-def get_computer_move(board, valid_moves):
+def get_computer_move(board, valid_moves, max_time=None, max_nodes=None, workers=1, use_book=True):
     # A simple random move generator for the computer
     # return valid_moves[random.randint(0, len(valid_moves) - 1)]
-    return find_best_move(board, valid_moves)
-
-
-def find_best_move(board, valid_moves):
-    turn_multiplier = 1 if board.white_to_move else -1
-    opponent_min_max_score = 10000
-    best_player_move = None
-    random.shuffle(valid_moves)
-    for player_move in valid_moves:
-        board.make_move(player_move)
-        opponents_moves = board.get_valid_moves()
-        # After our move, it's opponent's turn. Check their situation.
-        if len(opponents_moves) == 0:
-            if board.is_in_check():
-                # We checkmated the opponent, this is the best possible outcome.
-                opponent_max_score = 1000 
+    book = get_opening_book() if use_book else None
+    if book is not None:
+        move = book.choose_move(board, valid_moves)
+        if move is not None:
+            return move
+    return find_best_move(board, valid_moves, max_time, max_nodes, workers)
+
+
+OPENING_BOOK_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "book.bin")
+BOOK_ENTRY = struct.Struct("<QII")  # Zobrist key, packed Move.value, weight
+
+
+# Read-only opening book: fixed-size entries sorted by key, memory-mapped and binary searched, so looking up a
+# position only touches a few pages of the file. book.py builds these files from PGN.
+class OpeningBook:
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        size = os.fstat(self.file.fileno()).st_size
+        if size % BOOK_ENTRY.size:
+            self.file.close()
+            raise ValueError(f"Not an opening book: {path}")
+        self.count = size // BOOK_ENTRY.size
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    def entries(self, key):
+        # (move value, weight) for every book move of the position with this key.
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if BOOK_ENTRY.unpack_from(self.data, middle * BOOK_ENTRY.size)[0] < key:
+                low = middle + 1
             else:
-                # It's a stalemate, which is a draw.
-                opponent_max_score = 0
+                high = middle
+        found = []
+        for index in range(low, self.count):
+            entry_key, value, weight = BOOK_ENTRY.unpack_from(self.data, index * BOOK_ENTRY.size)
+            if entry_key != key:
+                break
+            found.append((value, weight))
+        return found
+
+    def choose_move(self, board, valid_moves, rng=random):
+        # Picks one of the legal book moves at random, in proportion to its weight. None when out of book.
+        weights = {value: weight for value, weight in self.entries(board.zobrist_key) if weight > 0}
+        candidates = [move for move in valid_moves if move.value in weights]
+        if not candidates:
+            return None
+        return rng.choices(candidates, [weights[move.value] for move in candidates])[0]
+
+    def close(self):
+        if self.count:
+            self.data.close()
+        self.file.close()
+
+
+opening_book = None
+
+
+def get_opening_book():
+    # The default book is opened on first use, if book.bin exists next to this file.
+    global opening_book
+    if opening_book is None and os.path.exists(OPENING_BOOK_PATH):
+        opening_book = OpeningBook(OPENING_BOOK_PATH)
+    return opening_book
+
+
+# Endgame bitbases: one byte per position of KQK, KRK or KPK, 0 if the side with the extra piece can't force a win,
+# else 1 + the number of plies to mate with best play on both sides. Positions are indexed with that side as white,
+# mirrored if needed: ((strong side to move ? 0 : 1) * 64 + strong king) * 64 + weak king) * 64 + piece square.
+# bitbase.py generates the files by retrograde analysis.
+BITBASE_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+BITBASE_PIECES = {WQ: "kqk", WR: "krk", WP: "kpk"}
+BITBASE_SIZE = 2 * 64 * 64 * 64
+BITBASE_WIN = 20000  # above any material balance, below mate scores
+bitbases = {}  # name -> memory-mapped file, or None if it doesn't exist; opened on first probe
+
+
+def bitbase_index(strong_to_move, strong_king, weak_king, piece_sq):
+    return (((0 if strong_to_move else 1) * 64 + strong_king) * 64 + weak_king) * 64 + piece_sq
+
+
+def get_bitbase(name):
+    if name not in bitbases:
+        path = os.path.join(BITBASE_DIRECTORY, name + ".bb")
+        bitbases[name] = None
+        if os.path.exists(path):
+            with open(path, "rb") as file:
+                if os.fstat(file.fileno()).st_size == BITBASE_SIZE:
+                    bitbases[name] = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    return bitbases[name]
+
+
+def probe_bitbase(board):
+    # Exact result for a king and one piece against a bare king, from the side to move's point of view, or None.
+    # A win scores less the longer the mate takes, so the search heads straight for it.
+    if board.occupied.bit_count() != 3:
+        return None
+    pieces = board.pieces
+    for piece in (WQ, WR, WP, BQ, BR, BP, WN, WB, BN, BB):
+        if pieces[piece]:
+            break
+    else:
+        return None
+    if piece in (WN, WB, BN, BB):
+        return 0  # a lone minor piece can't mate
+    strong_is_white = piece < BP
+    table = get_bitbase(BITBASE_PIECES[piece if strong_is_white else piece - BP])
+    if table is None:
+        return None
+    flip = 0 if strong_is_white else 56  # mirror ranks so the strong side plays up the board as white
+    strong_king = (pieces[WK if strong_is_white else BK].bit_length() - 1) ^ flip
+    weak_king = (pieces[BK if strong_is_white else WK].bit_length() - 1) ^ flip
+    piece_sq = (pieces[piece].bit_length() - 1) ^ flip
+    strong_to_move = board.white_to_move == strong_is_white
+    distance = table[bitbase_index(strong_to_move, strong_king, weak_king, piece_sq)]
+    if not distance:
+        return 0
+    score = BITBASE_WIN - (distance - 1)
+    return score if strong_to_move else -score
+
+
+CHECKMATE = 100000
+STALEMATE = 0
+MAX_PLY = 64
+MATE_THRESHOLD = CHECKMATE - MAX_PLY  # scores beyond this are forced mates
+NULL_MOVE_REDUCTION = 2  # extra plies taken off the search after a null move
+DELTA_MARGIN = 200  # quiescence skips captures that can't bring the score within this of alpha
+
+# Bound types for transposition table entries: the stored score is exact, a lower bound or an upper bound.
+EXACT, LOWER_BOUND, UPPER_BOUND = 0, 1, 2
+TTEntry = namedtuple("TTEntry", ["key", "depth", "score", "bound", "move", "age"])  # move is a packed Move.value
+
+
+# Fixed-size hash table of searched positions, indexed by the low bits of their Zobrist key.
+class TranspositionTable:
+    def __init__(self, size=1 << 18):
+        if size & (size - 1):
+            raise ValueError("Transposition table size must be a power of two.")
+        self.mask = size - 1
+        self.entries = [None] * size
+        self.age = 0
+
+    def probe(self, key):
+        entry = self.entries[key & self.mask]
+        if entry is not None and entry.key == key:
+            return entry
+        return None
+
+    def store(self, key, depth, score, bound, move):
+        index = key & self.mask
+        entry = self.entries[index]
+        # Prefer keeping deeper results, but always overwrite the same position or entries left over from older searches.
+        if entry is None or entry.key == key or entry.age != self.age or depth >= entry.depth:
+            self.entries[index] = TTEntry(key, depth, score, bound, move, self.age)
+
+    def new_search(self):
+        self.age += 1
+
+    def clear(self):
+        self.entries = [None] * len(self.entries)
+        self.age = 0
+
+
+transposition_table = TranspositionTable()
+
+
+# Cache of pawn-structure scores by Board.pawn_key. Pawns move rarely compared to other pieces, so most nodes of a
+# search find their pawn structure already scored.
+class PawnHashTable:
+    def __init__(self, size=1 << 14):
+        if size & (size - 1):
+            raise ValueError("Pawn hash table size must be a power of two.")
+        self.mask = size - 1
+        self.keys = [None] * size
+        self.scores = [0] * size
+
+    def probe(self, key):
+        index = key & self.mask
+        if self.keys[index] == key:
+            return self.scores[index]
+        return None
+
+    def store(self, key, score):
+        index = key & self.mask
+        self.keys[index] = key
+        self.scores[index] = score
+
+    def clear(self):
+        self.keys = [None] * len(self.keys)
+
+
+pawn_table = PawnHashTable()
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+# Counters from one search, returned by find_best_move(..., with_stats=True) and passed to on_iteration callbacks.
+class SearchStats:
+    def __init__(self, depth=0, score=0, best_move=None, nodes=0, qnodes=0, elapsed=0.0, cutoffs=0,
+                 first_move_cutoffs=0, tt_hits=0, seldepth=0, iteration_nodes=(), profile=None):
+        self.depth = depth  # last completed iteration
+        self.score = score  # centipawns, side to move's point of view
+        self.best_move = best_move
+        self.nodes = nodes  # including quiescence nodes
+        self.qnodes = qnodes
+        self.elapsed = elapsed
+        self.cutoffs = cutoffs
+        self.first_move_cutoffs = first_move_cutoffs  # cutoffs by the first move tried, a measure of move ordering
+        self.tt_hits = tt_hits
+        self.seldepth = seldepth  # deepest ply reached, quiescence included
+        self.iteration_nodes = list(iteration_nodes)  # nodes searched by each completed iteration
+        self.profile = profile  # {name: (calls, seconds)} when profiling
+
+    @property
+    def nodes_per_second(self):
+        return self.nodes / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def branching_factor(self):
+        # effective branching factor: how many times more nodes the last iteration took than the one before
+        if len(self.iteration_nodes) < 2 or self.iteration_nodes[-2] == 0:
+            return 0.0
+        return self.iteration_nodes[-1] / self.iteration_nodes[-2]
+
+    @property
+    def cutoff_rate(self):
+        interior = self.nodes - self.qnodes
+        return self.cutoffs / interior if interior else 0.0
+
+    @property
+    def first_move_cutoff_rate(self):
+        return self.first_move_cutoffs / self.cutoffs if self.cutoffs else 0.0
+
+    def __str__(self):
+        move = self.best_move.get_chess_notation() if self.best_move is not None else "none"
+        text = (f"depth {self.depth} seldepth {self.seldepth} score {self.score} move {move} nodes {self.nodes} "
+                f"qnodes {self.qnodes} time {self.elapsed:.3f}s nps {self.nodes_per_second:,.0f} "
+                f"ebf {self.branching_factor:.2f} cutoffs {100 * self.cutoff_rate:.1f}% "
+                f"first-move {100 * self.first_move_cutoff_rate:.1f}% tt-hits {self.tt_hits}")
+        if self.profile:
+            for name, (calls, seconds) in sorted(self.profile.items(), key=lambda item: -item[1][1]):
+                if calls == 0:
+                    continue
+                text += f"\n  {name:26} {calls:9} calls {seconds:8.3f}s {1e6 * seconds / max(calls, 1):7.2f}us/call"
+        return text
+
+    @classmethod
+    def combine(cls, all_stats):
+        # Totals over searches run side by side, e.g. by parallel_search's workers.
+        combined = cls(depth=min(stats.depth for stats in all_stats),
+                       elapsed=max(stats.elapsed for stats in all_stats))
+        for stats in all_stats:
+            combined.nodes += stats.nodes
+            combined.qnodes += stats.qnodes
+            combined.cutoffs += stats.cutoffs
+            combined.first_move_cutoffs += stats.first_move_cutoffs
+            combined.tt_hits += stats.tt_hits
+            combined.seldepth = max(combined.seldepth, stats.seldepth)
+            if stats.profile:
+                profile = combined.profile = combined.profile or {}
+                for name, (calls, seconds) in stats.profile.items():
+                    total_calls, total_seconds = profile.get(name, (0, 0.0))
+                    profile[name] = (total_calls + calls, total_seconds + seconds)
+        return combined
+
+
+# Opt-in call counters and timers for the search's hot paths. While enabled, the Board methods below are replaced
+# by timing wrappers; disabling puts the originals back, so searches that don't profile pay nothing.
+# Times are inclusive: get_valid_moves also counts the check_for_pins_and_checks and generate_moves it calls.
+class Profiler:
+    BOARD_METHODS = ("get_valid_moves", "check_for_pins_and_checks", "generate_moves", "find_legal_move",
+                     "make_move", "undo_move")
+
+    def __init__(self):
+        self.calls = {}
+        self.seconds = {}
+        self.originals = {}
+
+    def wrap(self, name, function):
+        calls, seconds = self.calls, self.seconds
+        calls.setdefault(name, 0)
+        seconds.setdefault(name, 0.0)
+        perf_counter = time.perf_counter
+
+        def timed(*args, **kwargs):
+            start = perf_counter()
+            result = function(*args, **kwargs)
+            seconds[name] += perf_counter() - start
+            calls[name] += 1
+            return result
+
+        return timed
+
+    def enable(self):
+        for name in self.BOARD_METHODS:
+            if name not in self.originals:
+                self.originals[name] = Board.__dict__[name]
+                setattr(Board, name, self.wrap(name, self.originals[name]))
+
+    def disable(self):
+        for name, function in self.originals.items():
+            setattr(Board, name, function)
+        self.originals = {}
+
+    def report(self):
+        return {name: (self.calls[name], self.seconds[name]) for name in self.calls}
+
+
+# Iterative-deepening negamax alpha-beta search, stopped early by an optional time (seconds) or node budget.
+class Search:
+    def __init__(self, board, max_depth, max_time=None, max_nodes=None, table=None, evaluator=None,
+                 on_iteration=None, profile=False):
+        self.board = board
+        self.evaluate = evaluate if evaluator is None else evaluator  # static evaluation, white's point of view
+        self.max_depth = max_depth
+        self.max_nodes = max_nodes
+        self.start_time = time.perf_counter()
+        self.deadline = None if max_time is None else self.start_time + max_time
+        self.table = transposition_table if table is None else table
+        self.on_iteration = on_iteration  # called with a SearchStats after every completed iteration
+        self.stopped = False
+        self.profiler = Profiler() if profile else None
+        if self.profiler is not None:
+            self.evaluate = self.profiler.wrap("evaluate", self.evaluate)
+        self.nodes = 0
+        self.qnodes = 0
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+        self.tt_hits = 0
+        self.seldepth = 0
+        self.iteration_nodes = []
+        self.best_move = None
+        self.best_score = 0
+        self.completed_depth = 0
+        self.iterations = []  # (depth, score, move) for each completed iteration
+        self.killers = [[None, None] for _ in range(MAX_PLY)]  # two quiet moves per ply that caused cutoffs
+        self.history = [0] * (12 * 64)  # quiet cutoffs, indexed by moved piece and end square
+
+    def order_root_moves(self, valid_moves):
+        board = self.board
+        board.in_check, board.pins, board.checks = board.check_for_pins_and_checks()
+        order = {move.value: i for i, move in enumerate(self.ordered_moves(None, 0))}
+        return sorted(valid_moves, key=lambda move: order.get(move.value, len(order)))
+
+    def run(self, valid_moves):
+        if not valid_moves:
+            return None  # checkmate or stalemate: nothing to search
+        self.table.new_search()
+        if self.profiler is not None:
+            self.profiler.enable()
+        try:
+            root_moves = self.order_root_moves(valid_moves)
+            self.iterate(root_moves)
+        finally:
+            if self.profiler is not None:
+                self.profiler.disable()
+        if self.best_move is None:
+            self.best_move = root_moves[0]
+        return self.best_move
+
+    def iterate(self, root_moves):
+        board = self.board
+        root_ply = board.state_ply
+        for depth in range(1, self.max_depth + 1):
+            nodes = self.nodes
+            try:
+                score, move = self.search_root(root_moves, depth)
+            except SearchTimeout:
+                # unwind the moves (and null moves) the aborted iteration left on the board
+                while board.state_ply > root_ply:
+                    if board.last_move_was_null():
+                        board.undo_null_move()
+                    else:
+                        board.undo_move()
+                break
+            self.best_move, self.best_score, self.completed_depth = move, score, depth
+            self.iterations.append((depth, score, move))
+            self.iteration_nodes.append(self.nodes - nodes)
+            if self.on_iteration is not None:
+                self.on_iteration(self.get_stats())
+            # the next iteration searches this iteration's best move first
+            root_moves.remove(move)
+            root_moves.insert(0, move)
+            if abs(score) >= MATE_THRESHOLD:
+                break
+
+    def get_stats(self):
+        return SearchStats(self.completed_depth, self.best_score, self.best_move, self.nodes, self.qnodes,
+                           time.perf_counter() - self.start_time, self.cutoffs, self.first_move_cutoffs,
+                           self.tt_hits, self.seldepth, self.iteration_nodes,
+                           self.profiler.report() if self.profiler is not None else None)
+
+    def search_root(self, root_moves, depth):
+        alpha, beta = -CHECKMATE - 1, CHECKMATE + 1
+        best_move = None
+        for move in root_moves:
+            self.board.make_move(move)
+            score = -self.nega_max_alpha_beta(depth - 1, -beta, -alpha, 1)
+            self.board.undo_move()
+            if score > alpha:
+                alpha = score
+                best_move = move
+        self.table.store(self.board.zobrist_key, depth, alpha, EXACT, best_move.value)
+        return alpha, best_move
+
+    def stop(self):
+        # Safe to call from another thread: the search notices within 64 nodes and keeps its last completed iteration.
+        self.stopped = True
+
+    def out_of_budget(self):
+        if self.stopped:
+            return True
+        if self.max_nodes is not None and self.nodes >= self.max_nodes:
+            return True
+        return self.deadline is not None and time.perf_counter() >= self.deadline
+
+    def nega_max_alpha_beta(self, depth, alpha, beta, ply, allow_null=True):
+        self.nodes += 1
+        if self.nodes & 63 == 0 and self.out_of_budget():
+            raise SearchTimeout()
+        board = self.board
+        if ply > 0 and board.is_repetition():
+            return STALEMATE  # a repetition is a draw, or can be made one, so cycling can't look like progress
+        if ply > 0 and board.occupied.bit_count() == 3:
+            score = probe_bitbase(board)
+            if score is not None:
+                return score
+        if depth == 0:
+            return self.quiescence(alpha, beta, ply)
+
+        alpha_original = alpha
+        hash_move = None
+        entry = self.table.probe(board.zobrist_key)
+        if entry is not None:
+            self.tt_hits += 1
+            hash_move = entry.move
+            if entry.depth >= depth:
+                score = score_from_table(entry.score, ply)
+                if entry.bound == EXACT:
+                    return score
+                if entry.bound == LOWER_BOUND and score >= beta:
+                    return score
+                if entry.bound == UPPER_BOUND and score <= alpha:
+                    return score
+
+        # Null-move pruning: if passing the turn still fails high on a reduced search, a real move would too.
+        # Skipped in check, right after another null move, and with only pawns left, where zugzwang is common.
+        if allow_null and depth > NULL_MOVE_REDUCTION and beta < MATE_THRESHOLD:
+            own = board.occupancy[0 if board.white_to_move else 1]
+            pawns_and_king = board.pieces[WP] | board.pieces[WK] | board.pieces[BP] | board.pieces[BK]
+            if own & ~pawns_and_king and not board.is_in_check():
+                board.make_null_move()
+                score = -self.nega_max_alpha_beta(depth - 1 - NULL_MOVE_REDUCTION, -beta, -beta + 1, ply + 1, False)
+                board.undo_null_move()
+                if score >= beta:
+                    return beta
+
+        max_score = -CHECKMATE - 1
+        best_move = None
+        searched = 0
+        for move in self.ordered_moves(hash_move, ply):
+            searched += 1
+            board.make_move(move)
+            score = -self.nega_max_alpha_beta(depth - 1, -beta, -alpha, ply + 1)
+            board.undo_move()
+            if score > max_score:
+                max_score = score
+                best_move = move
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        self.cutoffs += 1
+                        if searched == 1:
+                            self.first_move_cutoffs += 1
+                        if move.captured == EMPTY and not move.value & (MOVE_PROMOTION | MOVE_ENPASSANT):
+                            self.add_quiet_cutoff(move, depth, ply)
+                        break
+        if best_move is None:
+            return -CHECKMATE + ply if board.in_check else STALEMATE
+
+        if max_score <= alpha_original:
+            bound = UPPER_BOUND
+        elif max_score >= beta:
+            bound = LOWER_BOUND
         else:
-            opponent_max_score = -10000 # Assume the worst for us initially
-            for opponents_move in opponents_moves:
-                board.make_move(opponents_move)
-                # Now it's our turn again. We just evaluate the board state.
-                # A more advanced AI would recurse here.
-                score = -turn_multiplier * score_material(board.board)
-                if score > opponent_max_score:
-                    opponent_max_score = score
-                board.undo_move()
-
-        if opponent_max_score < opponent_min_max_score:
-            opponent_min_max_score = opponent_max_score
-            best_player_move = player_move
-        board.undo_move()
-    return best_player_move
+            bound = EXACT
+        self.table.store(board.zobrist_key, depth, score_to_table(max_score, ply), bound, best_move.value)
+        return max_score
 
-def score_material(board):
-    score = 0
-    for row in board:
-        for square in row:
-            if square[0] == 'w':
-                score += piece_score[square[1]]
-            elif square[0] == 'b':
-                score -= piece_score[square[1]]
+    def quiescence(self, alpha, beta, ply):
+        # Searches captures only until the position is quiet, so leaves aren't scored in the middle of an
+        # exchange. A side not in check may stand pat on the static evaluation; in check, all evasions are tried.
+        board = self.board
+        if ply > self.seldepth:
+            self.seldepth = ply
+        if board.occupied.bit_count() == 3:
+            score = probe_bitbase(board)
+            if score is not None:
+                return score
+        board.in_check, board.pins, board.checks = board.check_for_pins_and_checks()
+        in_check = board.in_check
+        if in_check and ply < MAX_PLY:
+            moves = board.generate_moves(ALL_MOVES)
+            if len(moves) == 0:
+                return -CHECKMATE + ply
+            max_score = -CHECKMATE - 1
+        else:
+            stand_pat = (1 if board.white_to_move else -1) * self.evaluate(board)
+            if stand_pat >= beta or ply >= MAX_PLY:
+                return stand_pat
+            if stand_pat > alpha:
+                alpha = stand_pat
+            max_score = stand_pat
+            moves = board.generate_moves(CAPTURES)
+        moves.sort(key=mvv_lva, reverse=True)
+        for move in moves:
+            if not in_check:
+                # delta pruning: not even winning the piece, plus a margin for position, would reach alpha
+                if stand_pat + capture_gain(move) + DELTA_MARGIN <= alpha:
+                    continue
+                if board.static_exchange(move) < 0:
+                    continue
+            self.nodes += 1
+            self.qnodes += 1
+            if self.nodes & 63 == 0 and self.out_of_budget():
+                raise SearchTimeout()
+            board.make_move(move)
+            score = -self.quiescence(-beta, -alpha, ply + 1)
+            board.undo_move()
+            if score > max_score:
+                max_score = score
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+        return max_score
+
+    def ordered_moves(self, hash_move, ply):
+        # Staged move picker: the hash move, captures by MVV-LVA, killers, then quiet moves by history score.
+        # Each stage is only generated once the previous one is used up, so a cutoff skips the rest.
+        board = self.board
+        # Searching a move overwrites the board's check and pin state, so it is put back before each stage.
+        state = board.check_for_pins_and_checks()
+        board.in_check, board.pins, board.checks = state
+        if hash_move is not None:
+            move = board.find_legal_move(hash_move)
+            if move is not None:
+                yield move
+            board.in_check, board.pins, board.checks = state
+        captures = board.generate_moves(CAPTURES)
+        captures.sort(key=mvv_lva, reverse=True)
+        for move in captures:
+            if move.value != hash_move:
+                yield move
+        killers = self.killers[ply] if ply < MAX_PLY else (None, None)
+        for killer in killers:
+            if killer is not None and killer != hash_move:
+                board.in_check, board.pins, board.checks = state
+                move = board.find_legal_move(killer)
+                if move is not None and move.captured == EMPTY:
+                    yield move
+        board.in_check, board.pins, board.checks = state
+        quiets = board.generate_moves(QUIETS)
+        history = self.history
+        quiets.sort(key=lambda move: history[move.moved * 64 + (move.value >> 6 & 63)], reverse=True)
+        for move in quiets:
+            if move.value != hash_move and move.value not in killers:
+                yield move
+        board.in_check, board.pins, board.checks = state
+
+    def add_quiet_cutoff(self, move, depth, ply):
+        if ply < MAX_PLY:
+            killers = self.killers[ply]
+            if killers[0] != move.value:
+                killers[1] = killers[0]
+                killers[0] = move.value
+        self.history[move.moved * 64 + (move.value >> 6 & 63)] += depth * depth
+
+
+def capture_gain(move):
+    # Material won by a capture or promotion: en passant takes a pawn and promotions add the new piece.
+    value = move.value
+    gain = ORDER_VALUES[move.captured]
+    if value & MOVE_ENPASSANT:
+        gain = ORDER_VALUES[WP]
+    if value & MOVE_PROMOTION:
+        gain += ORDER_VALUES[move.promoted] - ORDER_VALUES[WP]
+    return gain
+
+
+def mvv_lva(move):
+    # Most valuable victim first, then least valuable attacker.
+    return capture_gain(move) * 16 - ORDER_VALUES[move.moved]
+
+
+def score_to_table(score, ply):
+    # Mate scores are stored relative to the node rather than the root so they stay valid at any ply.
+    if score >= MATE_THRESHOLD:
+        return score + ply
+    if score <= -MATE_THRESHOLD:
+        return score - ply
     return score
 
 
-piece_score = {"K": 0, "Q": 10, "R": 5, "B": 3, "N": 3, "P": 1}
+def score_from_table(score, ply):
+    if score >= MATE_THRESHOLD:
+        return score - ply
+    if score <= -MATE_THRESHOLD:
+        return score + ply
+    return score
+
+
+def find_best_move(board, valid_moves, max_time=None, max_nodes=None, workers=1, on_iteration=None, profile=False,
+                   with_stats=False):
+    # Searches up to board.depth plies; with a budget, returns the best move of the last completed iteration.
+    # With more than one worker the root moves are split across a process pool, and on_iteration is only called
+    # once, with the workers' combined stats. with_stats=True returns (move, SearchStats) instead of the move.
+    if workers > 1 and len(valid_moves) > 1:
+        move, stats = parallel_search(board, valid_moves, workers, max_time, max_nodes, profile)
+        if on_iteration is not None:
+            on_iteration(stats)
+    else:
+        search = Search(board, board.depth, max_time, max_nodes, on_iteration=on_iteration, profile=profile)
+        move = search.run(valid_moves)
+        stats = search.get_stats()
+    return (move, stats) if with_stats else move
+
+
+search_pool = None
+search_pool_workers = 0
+
+
+def get_search_pool(workers):
+    # The pool is kept between moves so workers start once and keep their own transposition tables warm.
+    global search_pool, search_pool_workers
+    if search_pool is None or search_pool_workers != workers:
+        if search_pool is not None:
+            search_pool.terminate()
+        search_pool = multiprocessing.Pool(workers)
+        search_pool_workers = workers
+    return search_pool
+
+
+def search_root_moves(board, root_moves, max_depth, max_time, max_nodes, profile):
+    # Runs in a pool worker: an iterative-deepening search limited to some of the root moves.
+    search = Search(board, max_depth, max_time, max_nodes, profile=profile)
+    search.run(root_moves)
+    stats = search.get_stats()
+    stats.best_move = None  # the caller maps move values back to its own Move objects
+    return [(depth, score, move.value) for depth, score, move in search.iterations], stats
+
+
+def parallel_search(board, valid_moves, workers, max_time=None, max_nodes=None, profile=False):
+    # Returns (move, SearchStats).
+    # Root splitting: the ordered root moves are dealt round-robin to the workers, which each search their share
+    # to full depth. Only depths every worker completed are compared, so a budget can't mix shallow and deep
+    # scores; a worker that stopped early on a forced mate keeps its mate score at every deeper depth.
+    root_moves = Search(board, board.depth).order_root_moves(valid_moves)
+    workers = min(workers, len(root_moves))
+    node_budget = None if max_nodes is None else max(1, max_nodes // workers)
+    tasks = [(board, root_moves[i::workers], board.depth, max_time, node_budget, profile) for i in range(workers)]
+    start = time.perf_counter()
+    results = get_search_pool(workers).starmap(search_root_moves, tasks)
+    stats = SearchStats.combine([worker_stats for _, worker_stats in results])
+    stats.elapsed = time.perf_counter() - start
+    results = [iterations for iterations, _ in results]
+    if not all(results):
+        stats.best_move = root_moves[0]
+        return root_moves[0], stats
+    unfinished = [iterations[-1][0] for iterations in results if abs(iterations[-1][1]) < MATE_THRESHOLD]
+    depth = min(unfinished) if unfinished else max(iterations[-1][0] for iterations in results)
+    best_value, best_score = None, -CHECKMATE - 1
+    for iterations in results:
+        _, score, value = iterations[min(depth, len(iterations)) - 1]
+        if score > best_score:
+            best_value, best_score = value, score
+    stats.depth, stats.score = depth, best_score
+    for move in root_moves:
+        if move.value == best_value:
+            stats.best_move = move
+            return move, stats
+
+
+def score_material(board):
+    # Board keeps the running totals up to date in put_piece/remove_piece, so neither scans the squares.
+    return board.material_score
+
+
+def evaluate(board):
+    # Static evaluation in centipawns from white's point of view.
+    return board.material_score + board.position_score + evaluate_pawns(board)
+
+
+def evaluate_pawns(board):
+    # Pawn structure from pawn_table (or scored and cached on a miss), plus king pawn shields. The shields depend on
+    # the king's square too, but only cost two mask lookups, so they are added outside the cache.
+    score = pawn_table.probe(board.pawn_key)
+    if score is None:
+        score = score_pawn_structure(board.pieces[WP], board.pieces[BP])
+        pawn_table.store(board.pawn_key, score)
+    pieces = board.pieces
+    shields = (SHIELD_MASKS[0][pieces[WK].bit_length() - 1] & pieces[WP]).bit_count() - \
+        (SHIELD_MASKS[1][pieces[BK].bit_length() - 1] & pieces[BP]).bit_count()
+    return score + PAWN_SHIELD_BONUS * shields
+
+
+def score_pawn_structure(white_pawns, black_pawns):
+    # Doubled, isolated and passed pawns, white minus black.
+    score = 0
+    for color, own, enemy in ((0, white_pawns, black_pawns), (1, black_pawns, white_pawns)):
+        side_score = 0
+        for c in range(8):
+            on_file = (own & FILES[c]).bit_count()
+            if on_file > 1:
+                side_score -= DOUBLED_PAWN_PENALTY * (on_file - 1)
+            if on_file and not own & ADJACENT_FILES[c]:
+                side_score -= ISOLATED_PAWN_PENALTY * on_file
+        pawns = own
+        while pawns:
+            bit = pawns & -pawns
+            pawns ^= bit
+            sq = bit.bit_length() - 1
+            if not PASSED_MASKS[color][sq] & enemy:
+                side_score += PASSED_PAWN_BONUS[7 - (sq >> 3) if color == 0 else sq >> 3]
+        score += side_score if color == 0 else -side_score
+    return score
 
 
 def main():
@@ -580,17 +1808,23 @@ def main():
 
 
 def get_player_move(board, valid_moves):
-    move_notation = input("Enter your move (e.g. e2e4): ")
-    if len(move_notation) == 4 and move_notation[0].isalpha() and move_notation[1].isdigit() and \
+    move_notation = input("Enter your move (e.g. e2e4, or e7e8n to underpromote): ")
+    if len(move_notation) in (4, 5) and move_notation[0].isalpha() and move_notation[1].isdigit() and \
             move_notation[2].isalpha() and move_notation[3].isdigit():
         start_col = Move.files_to_cols.get(move_notation[0])
         start_row = Move.ranks_to_rows.get(move_notation[1])
         end_col = Move.files_to_cols.get(move_notation[2])
         end_row = Move.ranks_to_rows.get(move_notation[3])
-        if start_row is not None and start_col is not None and end_row is not None and end_col is not None:
-            move = Move((start_row, start_col), (end_row, end_col), board.board)
-            if move in valid_moves:
-                return move
+        promotion_choice = move_notation[4].upper() if len(move_notation) == 5 else "Q"
+        if start_row is not None and start_col is not None and end_row is not None and end_col is not None and \
+                promotion_choice in PROMOTION_CHOICES:
+            # Matched by squares rather than Move equality, since the typed move doesn't know whether it castles
+            # or captures en passant; the legal move carries those flags.
+            start, end = start_row * 8 + start_col, end_row * 8 + end_col
+            for move in valid_moves:
+                if move.start == start and move.end == end and \
+                        (not move.is_pawn_promotion or move.promotion_choice == promotion_choice):
+                    return move
     return None
 
 
@@ -0,0 +1,108 @@
+import argparse
+import sys
+import time
+
+from chess import Board, START_FEN
+
+# Standard perft test positions with their known leaf counts by depth.
+PERFT_POSITIONS = {
+    "start": (START_FEN, {1: 20, 2: 400, 3: 8902, 4: 197281, 5: 4865609}),
+    "kiwipete": ("r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+                 {1: 48, 2: 2039, 3: 97862, 4: 4085603}),
+    "position3": ("8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+                  {1: 14, 2: 191, 3: 2812, 4: 43238, 5: 674624}),
+    "position4": ("r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+                  {1: 6, 2: 264, 3: 9467, 4: 422333}),
+    "position5": ("rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+                  {1: 44, 2: 1486, 3: 62379, 4: 2103487}),
+    "position6": ("r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+                  {1: 46, 2: 2079, 3: 89890, 4: 3894594}),
+    # Pawns pinned along their file with their own king in front of them can still push; counts from python-chess.
+    "file_pin_push": ("4K3/8/4P3/8/8/8/8/k3r3 w - - 0 1", {1: 6, 2: 85, 3: 503, 4: 8031}),
+    "file_pin_double_push": ("8/8/8/4K3/8/8/4P3/k3r3 w - - 0 1", {1: 10, 2: 103, 3: 864, 4: 13041}),
+    "file_pin_push_2": ("8/5k2/8/6K1/8/6P1/N4pq1/8 w - - 0 1", {1: 10, 2: 227, 3: 1828, 4: 48490}),
+}
+
+
+def perft(board, depth):
+    # Counts the leaf nodes of the legal move tree depth plies deep.
+    if depth == 0:
+        return 1
+    moves = board.get_valid_moves()
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        board.make_move(move)
+        nodes += perft(board, depth - 1)
+        board.undo_move()
+    return nodes
+
+
+def divide(board, depth):
+    # Perft split by root move, for finding which branch disagrees with a reference engine.
+    counts = {}
+    for move in board.get_valid_moves():
+        board.make_move(move)
+        counts[move.get_chess_notation()] = perft(board, depth - 1)
+        board.undo_move()
+    return counts
+
+
+def run_perft(fen, depth, show_divide=False):
+    board = Board(fen)
+    start = time.perf_counter()
+    if show_divide:
+        counts = divide(board, depth)
+        for notation in sorted(counts):
+            print(f"{notation}: {counts[notation]}")
+        nodes = sum(counts.values())
+    else:
+        nodes = perft(board, depth)
+    elapsed = time.perf_counter() - start
+    print(f"depth {depth}: {nodes} nodes in {elapsed:.3f}s ({nodes / max(elapsed, 1e-9):,.0f} nodes/s)")
+    return nodes
+
+
+def verify(max_nodes):
+    # Checks every known perft count up to max_nodes leaves against the move generator.
+    failures = 0
+    total_nodes = 0
+    start = time.perf_counter()
+    for name, (fen, expected_counts) in PERFT_POSITIONS.items():
+        for depth, expected in sorted(expected_counts.items()):
+            if expected > max_nodes:
+                break
+            nodes = perft(Board(fen), depth)
+            total_nodes += nodes
+            status = "ok" if nodes == expected else "FAIL"
+            if nodes != expected:
+                failures += 1
+            print(f"{name} depth {depth}: {nodes} (expected {expected}) {status}")
+    elapsed = time.perf_counter() - start
+    print(f"{total_nodes} nodes in {elapsed:.3f}s ({total_nodes / max(elapsed, 1e-9):,.0f} nodes/s), "
+          f"{failures} failure(s)")
+    return failures == 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Count move-generator leaf nodes (perft) for a position.")
+    parser.add_argument("depth", type=int, nargs="?", default=4)
+    parser.add_argument("--fen", help="position to search (defaults to the start position)")
+    parser.add_argument("--position", choices=sorted(PERFT_POSITIONS), help="one of the standard test positions")
+    parser.add_argument("--divide", action="store_true", help="print the node count below each root move")
+    parser.add_argument("--verify", action="store_true", help="check the generator against known perft counts")
+    parser.add_argument("--max-nodes", type=int, default=500000, help="largest known count --verify will run")
+    args = parser.parse_args()
+
+    if args.verify:
+        sys.exit(0 if verify(args.max_nodes) else 1)
+    if args.position:
+        fen = PERFT_POSITIONS[args.position][0]
+    else:
+        fen = args.fen or START_FEN
+    run_perft(fen, args.depth, args.divide)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+import os
+import re
+
+from chess import Board, PIECE_NAMES, Move, FULL_BOARD, WP, BP
+
+RESULTS = ("1-0", "0-1", "1/2-1/2", "*")
+TOKEN = re.compile(r"\{|\}|\(|\)|;|\$\d+|1-0|0-1|1/2-1/2|\*|\d+\.+|[^\s{}();$]+")
+HEADER = re.compile(r'\[\s*(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+SQUARE = re.compile(r"[a-h][1-8]")
+
+
+def read_games(lines):
+    # Yields (headers, san_moves) for each game of a PGN stream, one line at a time, so archives of any size can
+    # be read. Comments, NAGs and variations are skipped; san_moves is the main line only.
+    headers = {}
+    moves = []
+    in_comment = False
+    variation_depth = 0
+    for line in lines:
+        if not in_comment and variation_depth == 0 and line.startswith("["):
+            match = HEADER.match(line)
+            if match:
+                if moves:  # a game with no result token before the next game's headers
+                    yield headers, moves
+                    headers, moves = {}, []
+                headers[match.group(1)] = match.group(2)
+                continue
+        if line.startswith("%"):
+            continue  # escape line
+        for token in TOKEN.findall(line):
+            if in_comment:
+                if token == "}":
+                    in_comment = False
+                continue
+            if token == "{":
+                in_comment = True
+            elif token == ";":
+                break  # rest-of-line comment
+            elif token == "(":
+                variation_depth += 1
+            elif token == ")":
+                variation_depth = max(0, variation_depth - 1)
+            elif variation_depth or token[0] == "$" or token[0].isdigit() and token.endswith("."):
+                continue
+            elif token in RESULTS:
+                headers.setdefault("Result", token)
+                yield headers, moves
+                headers, moves = {}, []
+            else:
+                moves.append(token)
+    if moves:
+        yield headers, moves
+
+
+def san_to_move(san, valid_moves):
+    # Finds the legal move written in standard algebraic notation (e.g. "Nbd7", "exd8=Q+", "O-O").
+    # Raises ValueError if it matches no move, or more than one.
+    text = san.rstrip("+#!?")
+    if text in ("O-O", "0-0", "O-O-O", "0-0-0"):
+        end_col = 6 if len(text) == 3 else 2
+        for move in valid_moves:
+            if move.is_castle_move and move.end_col == end_col:
+                return move
+        raise ValueError(f"Illegal move: {san}")
+    promotion = None
+    if "=" in text:
+        text, promotion = text.split("=", 1)
+        promotion = promotion[:1].upper()
+    elif len(text) > 2 and text[-1] in "QRBNqrbn" and text[-2].isdigit() and text[0] in Move.files_to_cols:
+        text, promotion = text[:-1], text[-1].upper()  # pawn promotion written without '='
+    piece = text[0] if text[:1] in ("K", "Q", "R", "B", "N") else "P"
+    body = (text[1:] if piece != "P" else text).replace("x", "").replace("-", "").replace(":", "")
+    if len(body) < 2 or body[-2] not in Move.files_to_cols or body[-1] not in Move.ranks_to_rows:
+        raise ValueError(f"Invalid move: {san}")
+    end_row, end_col = Move.ranks_to_rows[body[-1]], Move.files_to_cols[body[-2]]
+    disambiguation = body[:-2]
+    matches = []
+    for move in valid_moves:
+        if move.end_row != end_row or move.end_col != end_col or PIECE_NAMES[move.moved][1] != piece:
+            continue
+        start = move.get_rank_file(move.start_row, move.start_col)
+        if any(char not in start for char in disambiguation):
+            continue
+        if move.is_pawn_promotion and move.promotion_choice != (promotion or "Q"):
+            continue
+        matches.append(move)
+    if len(matches) != 1:
+        raise ValueError(f"{'Ambiguous' if matches else 'Illegal'} move: {san}")
+    return matches[0]
+
+
+def candidate_moves(board, san):
+    # The legal moves of the pieces that could have played san, which is much cheaper than generating every
+    # legal move when replaying games. san_to_move picks the move out of these.
+    text = san.rstrip("+#!?")
+    offset = WP if board.white_to_move else BP
+    targets = FULL_BOARD
+    if text.startswith(("O-O", "0-0")):
+        piece = 5
+    else:
+        piece = "PNBRQK".find(text[0]) if text[:1] in ("K", "Q", "R", "B", "N") else 0
+        squares = SQUARE.findall(text)
+        if squares:
+            targets = 1 << (Move.ranks_to_rows[squares[-1][1]] * 8 + Move.files_to_cols[squares[-1][0]])
+    board.in_check, board.pins, board.checks = board.check_for_pins_and_checks()
+    moves = []
+    bb = board.pieces[offset + piece]
+    while bb:
+        bit = bb & -bb
+        bb ^= bit
+        moves += board.get_piece_moves(bit.bit_length() - 1, targets)
+    return moves
+
+
+def move_to_san(move, valid_moves):
+    # Standard algebraic notation for a legal move, without check marks.
+    if move.is_castle_move:
+        return "O-O" if move.end_col == 6 else "O-O-O"
+    piece = PIECE_NAMES[move.moved][1]
+    end = move.get_rank_file(move.end_row, move.end_col)
+    capture = "x" if move.piece_captured != "--" or move.is_enpassant_move else ""
+    if piece == "P":
+        san = (move.cols_to_files[move.start_col] + capture if capture else "") + end
+        return san + "=" + move.promotion_choice if move.is_pawn_promotion else san
+    rivals = [other for other in valid_moves if other.moved == move.moved and other.end == move.end and
+              other.start != move.start]
+    disambiguation = ""
+    if rivals:
+        start = move.get_rank_file(move.start_row, move.start_col)
+        if all(other.start_col != move.start_col for other in rivals):
+            disambiguation = start[0]
+        elif all(other.start_row != move.start_row for other in rivals):
+            disambiguation = start[1]
+        else:
+            disambiguation = start
+    return piece + disambiguation + capture + end
+
+
+def replay(headers, san_moves):
+    # Plays a game from its start position (the FEN header if present), yielding (board, move) before each move.
+    board = Board(headers["FEN"]) if "FEN" in headers else Board()
+    for san in san_moves:
+        move = san_to_move(san, candidate_moves(board, san))
+        yield board, move
+        board.make_move(move)
+
+
+def split_pgn(path, chunk_size):
+    # Byte ranges of about chunk_size that each start at a game's first header line, so every chunk can be
+    # parsed on its own. Games are assumed to start with an Event tag, as the PGN standard requires.
+    size = os.path.getsize(path)
+    chunks = []
+    start = 0
+    with open(path, "rb") as file:
+        while start < size:
+            file.seek(start + chunk_size)
+            end = size
+            if start + chunk_size < size:
+                file.readline()  # skip the (probably partial) line the seek landed in
+                while True:
+                    position = file.tell()
+                    line = file.readline()
+                    if not line:
+                        break
+                    if line.startswith(b"[Event "):
+                        end = position
+                        break
+            chunks.append((start, end))
+            start = end
+    return chunks
+
+
+def read_chunk(path, start, end):
+    # The lines of one byte range of a PGN file, read lazily.
+    with open(path, "rb") as file:
+        file.seek(start)
+        position = start
+        while position < end:
+            line = file.readline()
+            if not line:
+                break
+            position += len(line)
+            yield line.decode("utf-8", "replace")
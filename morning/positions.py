@@ -0,0 +1,195 @@
+import argparse
+import heapq
+import mmap
+import multiprocessing
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import time
+
+from chess import Board
+from pgn import read_games, read_chunk, replay, split_pgn, move_to_san
+
+POSITION_INDEX_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "positions.bin")
+POSITION_ENTRY = struct.Struct("<QIIII")  # Zobrist key, games, white wins, draws, black wins; sorted by key
+RESULT_COLUMNS = {"1-0": 2, "1/2-1/2": 3, "0-1": 4}  # entry field each result is counted in
+CHUNK_SIZE = 16 << 20  # bytes of PGN per worker task
+
+
+class PositionIndex:
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        size = os.fstat(self.file.fileno()).st_size
+        if size % POSITION_ENTRY.size:
+            self.file.close()
+            raise ValueError(f"Not a position index: {path}")
+        self.count = size // POSITION_ENTRY.size
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    def lookup(self, key):
+        # (games, white wins, draws, black wins) of the position with this key, or None if it never occurred.
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if POSITION_ENTRY.unpack_from(self.data, middle * POSITION_ENTRY.size)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.count:
+            entry = POSITION_ENTRY.unpack_from(self.data, low * POSITION_ENTRY.size)
+            if entry[0] == key:
+                return entry[1:]
+        return None
+
+    def close(self):
+        if self.count:
+            self.data.close()
+        self.file.close()
+
+
+def index_chunk(task):
+    # Runs in a worker. Counts every position of the games in one byte range of a PGN file and writes the counts,
+    # sorted by key, to run_path. A position is counted once per game, however often it repeats there.
+    path, start, end, max_ply, run_path = task
+    counts = {}
+    games = errors = 0
+    for headers, san_moves in read_games(read_chunk(path, start, end)):
+        games += 1
+        column = RESULT_COLUMNS.get(headers.get("Result"))
+        keys = set()
+        board = None
+        try:
+            for board, move in replay(headers, san_moves[:max_ply]):
+                keys.add(board.zobrist_key)
+        except ValueError:
+            errors += 1  # the game is kept up to the bad move
+        if board is not None:
+            keys.add(board.zobrist_key)
+        for key in keys:
+            entry = counts.get(key)
+            if entry is None:
+                entry = counts[key] = [key, 0, 0, 0, 0]
+            entry[1] += 1
+            if column is not None:
+                entry[column] += 1
+    with open(run_path, "wb") as run:
+        for key in sorted(counts):
+            run.write(POSITION_ENTRY.pack(*counts[key]))
+    return games, errors, len(counts)
+
+
+def read_run(run_path):
+    with open(run_path, "rb") as run:
+        while True:
+            data = run.read(POSITION_ENTRY.size * 4096)
+            if not data:
+                break
+            yield from POSITION_ENTRY.iter_unpack(data)
+
+
+def merge_runs(run_paths, index_path):
+    # Streams the sorted runs into one index, adding up the counts of keys that appear in several of them.
+    positions = 0
+    with open(index_path, "wb") as index:
+        current = None
+        for entry in heapq.merge(*(read_run(run_path) for run_path in run_paths)):
+            if current is not None and entry[0] == current[0]:
+                for column in range(1, 5):
+                    current[column] += entry[column]
+                continue
+            if current is not None:
+                index.write(POSITION_ENTRY.pack(*current))
+                positions += 1
+            current = list(entry)
+        if current is not None:
+            index.write(POSITION_ENTRY.pack(*current))
+            positions += 1
+    return positions
+
+
+def build_index(pgn_paths, index_path, workers=1, max_ply=None, chunk_size=CHUNK_SIZE):
+    # Splits the PGN files into chunks at game boundaries, indexes the chunks in parallel, each into its own
+    # sorted run file, and merges the runs. Memory use is bounded by the chunk size, not the archive size.
+    run_directory = tempfile.mkdtemp(prefix="positions-", dir=os.path.dirname(os.path.abspath(index_path)))
+    tasks = []
+    for path in pgn_paths:
+        for start, end in split_pgn(path, chunk_size):
+            tasks.append((path, start, end, max_ply, os.path.join(run_directory, f"{len(tasks)}.run")))
+    games = errors = 0
+    try:
+        if workers <= 1:
+            results = map(index_chunk, tasks)
+        else:
+            pool = multiprocessing.Pool(workers)
+            results = pool.imap_unordered(index_chunk, tasks)
+        for chunk_games, chunk_errors, _ in results:
+            games += chunk_games
+            errors += chunk_errors
+        if workers > 1:
+            pool.close()
+            pool.join()
+        positions = merge_runs([task[-1] for task in tasks], index_path)
+    finally:
+        shutil.rmtree(run_directory)
+    return games, errors, positions
+
+
+def format_counts(counts):
+    games, white, draws, black = counts
+    return f"{games:8} games  +{100 * white / games:5.1f}% ={100 * draws / games:5.1f}% -{100 * black / games:5.1f}%"
+
+
+def probe(index_path, fen):
+    # Prints the counts of the position and of the position after each of its legal moves.
+    board = Board(fen)
+    valid_moves = board.get_valid_moves()
+    index = PositionIndex(index_path)
+    try:
+        counts = index.lookup(board.zobrist_key)
+        if counts is None:
+            print("position not in the index")
+            return
+        print(f"{'':8} {format_counts(counts)}")
+        replies = []
+        for move in valid_moves:
+            board.make_move(move)
+            reply = index.lookup(board.zobrist_key)
+            board.undo_move()
+            if reply is not None:
+                replies.append((reply, move_to_san(move, valid_moves)))
+        for reply, san in sorted(replies, key=lambda item: -item[0][0]):
+            print(f"{san:8} {format_counts(reply)}")
+    finally:
+        index.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Index the positions of PGN archives with their game counts and "
+                                                 "results, or query the index.")
+    parser.add_argument("--index", default=POSITION_INDEX_PATH, help="index file (defaults to positions.bin)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="index PGN files")
+    build.add_argument("pgn", nargs="+")
+    build.add_argument("--workers", type=int, default=os.cpu_count())
+    build.add_argument("--max-ply", type=int, help="only index the first plies of each game")
+    build.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="bytes of PGN per worker task")
+    query = commands.add_parser("probe", help="show the counts of a position and its continuations")
+    query.add_argument("--fen", default=Board().get_fen())
+    args = parser.parse_args()
+
+    if args.command == "build":
+        if args.chunk_size < 1:
+            sys.exit("--chunk-size must be positive")
+        start = time.perf_counter()
+        games, errors, positions = build_index(args.pgn, args.index, args.workers, args.max_ply, args.chunk_size)
+        elapsed = time.perf_counter() - start
+        print(f"{games} games ({errors} with illegal moves), {positions} positions written to {args.index} in "
+              f"{elapsed:.3f}s ({games / max(elapsed, 1e-9):.1f} games/s)")
+    else:
+        probe(args.index, args.fen)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+import argparse
+import math
+import multiprocessing
+import os
+import random
+import sys
+import time
+
+import chess
+from chess import Board, Search, OpeningBook, TranspositionTable, OPENING_BOOK_PATH
+
+EVALUATORS = {"full": chess.evaluate, "material": chess.score_material}
+DEFAULT_ENGINE = {"depth": Board().depth, "time": None, "nodes": None, "eval": "full", "book": False}
+
+
+def parse_engine(spec):
+    # "depth=3,time=0.5,nodes=20000,eval=material,book=1" -> engine configuration; unset keys keep their defaults.
+    engine = dict(DEFAULT_ENGINE)
+    for item in filter(None, spec.split(",")):
+        name, _, value = item.partition("=")
+        if name == "depth":
+            engine["depth"] = int(value)
+        elif name == "time":
+            engine["time"] = float(value)
+        elif name == "nodes":
+            engine["nodes"] = int(value)
+        elif name == "eval" and value in EVALUATORS:
+            engine["eval"] = value
+        elif name == "book":
+            engine["book"] = value not in ("0", "false", "no")
+        else:
+            raise argparse.ArgumentTypeError(f"Invalid engine option: {item!r}")
+    return engine
+
+
+def play_game(task):
+    # Runs in a worker. Plays one game and returns (game index, score for engine 1, reason, plies, nodes, seconds).
+    index, engine1, engine2, engine1_white, opening_seed, random_plies, max_plies = task
+    board = Board()
+    rng = random.Random(opening_seed)
+    for _ in range(random_plies):  # both games of a pair start from the same random opening
+        valid_moves = board.get_valid_moves()
+        if not valid_moves:
+            break
+        board.make_move(rng.choice(valid_moves))
+    book = OpeningBook(OPENING_BOOK_PATH) if (engine1["book"] or engine2["book"]) and \
+        os.path.exists(OPENING_BOOK_PATH) else None
+    # each engine keeps its own table, so neither reuses scores and moves found with the other's settings
+    tables = {True: TranspositionTable(), False: TranspositionTable()}  # keyed by "is engine 1"
+    start = time.perf_counter()
+    nodes = 0
+    repetitions = {board.zobrist_key: 1}
+    result, reason = None, "move limit"
+    while len(board.move_log) < max_plies:
+        valid_moves = board.get_valid_moves()
+        if not valid_moves:
+            if board.in_check:
+                white_won = not board.white_to_move
+                result, reason = (1.0 if white_won == engine1_white else 0.0), "checkmate"
+            else:
+                result, reason = 0.5, "stalemate"
+            break
+        if repetitions[board.zobrist_key] >= 3:
+            result, reason = 0.5, "threefold repetition"
+            break
+        if board.halfmove_clock >= 100:
+            result, reason = 0.5, "50-move rule"
+            break
+        is_engine1 = board.white_to_move == engine1_white
+        engine = engine1 if is_engine1 else engine2
+        move = book.choose_move(board, valid_moves, rng) if engine["book"] and book is not None else None
+        if move is None:
+            search = Search(board, engine["depth"], engine["time"], engine["nodes"], table=tables[is_engine1],
+                            evaluator=EVALUATORS[engine["eval"]])
+            move = search.run(valid_moves)
+            nodes += search.nodes
+        board.make_move(move)
+        repetitions[board.zobrist_key] = repetitions.get(board.zobrist_key, 0) + 1
+    if book is not None:
+        book.close()
+    if result is None:
+        result = 0.5
+    return index, result, reason, len(board.move_log), nodes, time.perf_counter() - start
+
+
+def elo(score):
+    # A perfect or zero score has no finite Elo difference.
+    if score <= 0:
+        return -math.inf
+    if score >= 1:
+        return math.inf
+    return -400 * math.log10(1 / score - 1) + 0.0  # + 0.0 turns -0.0 into 0.0
+
+
+def elo_with_error(wins, draws, losses):
+    # Elo difference for engine 1 with a 95% confidence interval. The interval is Wilson's, with the measured
+    # per-game score variance in place of p(1 - p), so it keeps a sensible width when every game had the same
+    # result, where the plain normal approximation collapses to a single point.
+    z = 1.96
+    games = wins + draws + losses
+    score = (wins + draws / 2) / games
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+    scale = 1 + z * z / games
+    center = (score + z * z / (2 * games)) / scale
+    margin = z * math.sqrt(variance / games + z * z / (4 * games * games)) / scale
+    return elo(score), elo(center - margin), elo(center + margin)
+
+
+def run_tournament(engine1, engine2, games, workers=1, random_plies=4, max_plies=400, seed=0):
+    # Games are played in pairs with the colors swapped, so neither engine gets the better openings.
+    tasks = [(i, engine1, engine2, i % 2 == 0, f"{seed}:{i // 2}", random_plies, max_plies) for i in range(games)]
+    wins = draws = losses = 0
+    total_nodes = 0
+    start = time.perf_counter()
+    if workers <= 1:
+        results = map(play_game, tasks)
+    else:
+        pool = multiprocessing.Pool(workers)
+        results = pool.imap_unordered(play_game, tasks)
+    for index, result, reason, plies, nodes, seconds in results:
+        total_nodes += nodes
+        if result == 1.0:
+            wins += 1
+        elif result == 0.0:
+            losses += 1
+        else:
+            draws += 1
+        print(f"game {index + 1}: {('1-0', '1/2-1/2', '0-1')[int(2 - 2 * result)]} for engine 1 "
+              f"({'white' if index % 2 == 0 else 'black'}), {reason} after {plies} plies, {nodes} nodes, "
+              f"{seconds:.2f}s", flush=True)
+    if workers > 1:
+        pool.close()
+        pool.join()
+    elapsed = time.perf_counter() - start
+    difference, low, high = elo_with_error(wins, draws, losses)
+    print(f"engine 1 vs engine 2: +{wins} ={draws} -{losses}, Elo {difference:+.0f} "
+          f"(95% interval {low:+.0f} to {high:+.0f})")
+    print(f"{games} games in {elapsed:.2f}s ({games / max(elapsed, 1e-9):.3f} games/s, "
+          f"{total_nodes / max(elapsed, 1e-9):,.0f} nodes/s over {max(workers, 1)} worker(s))")
+    return wins, draws, losses
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play engine configurations against each other without a board UI.")
+    parser.add_argument("--engine1", type=parse_engine, default=DEFAULT_ENGINE,
+                        help="options like depth=3,time=0.5,nodes=20000,eval=full|material,book=1")
+    parser.add_argument("--engine2", type=parse_engine, default=DEFAULT_ENGINE)
+    parser.add_argument("--games", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--random-plies", type=int, default=4, help="random opening moves before the engines play")
+    parser.add_argument("--max-plies", type=int, default=400, help="games this long are adjudicated as draws")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the random openings")
+    args = parser.parse_args()
+    if args.games < 1:
+        sys.exit("--games must be at least 1")
+    run_tournament(args.engine1, args.engine2, args.games, args.workers, args.random_plies, args.max_plies,
+                   args.seed)
+
+
+if __name__ == "__main__":
+    main()
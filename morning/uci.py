@@ -0,0 +1,196 @@
+import sys
+import threading
+import time
+
+from chess import Board, Search, START_FEN, MAX_PLY, MATE_THRESHOLD, CHECKMATE, get_opening_book, transposition_table
+
+ENGINE_NAME = "ECE 264 Chess"
+MOVES_TO_GO = 30  # moves a sudden-death clock is assumed to still have to cover
+output_lock = threading.Lock()
+
+
+def send(line):
+    with output_lock:
+        sys.stdout.write(line + "\n")
+        sys.stdout.flush()
+
+
+def find_move(board, notation):
+    for move in board.get_valid_moves():
+        if move.get_chess_notation() == notation:
+            return move
+    raise ValueError(f"Illegal move: {notation}")
+
+
+def principal_variation(board, table, max_length):
+    # Follows the hash moves from the root through the transposition table. Leaves the board as it found it.
+    moves = []
+    seen = set()
+    while len(moves) < max_length and board.zobrist_key not in seen:
+        seen.add(board.zobrist_key)
+        entry = table.probe(board.zobrist_key)
+        if entry is None or entry.move is None:
+            break
+        board.in_check, board.pins, board.checks = board.check_for_pins_and_checks()
+        move = board.find_legal_move(entry.move)
+        if move is None:
+            break
+        moves.append(move)
+        board.make_move(move)
+    for _ in moves:
+        board.undo_move()
+    return moves
+
+
+def format_score(score):
+    if score >= MATE_THRESHOLD:
+        return f"mate {(CHECKMATE - score + 1) // 2}"
+    if score <= -MATE_THRESHOLD:
+        return f"mate -{(CHECKMATE + score) // 2}"
+    return f"cp {score}"
+
+
+def allocate_time(params, white_to_move):
+    # Seconds to think, from the go command's clock fields; None means no time limit.
+    if "movetime" in params:
+        return params["movetime"] / 1000
+    time_left = params.get("wtime" if white_to_move else "btime")
+    if time_left is None:
+        return None
+    increment = params.get("winc" if white_to_move else "binc", 0)
+    budget = time_left / params.get("movestogo", MOVES_TO_GO) + increment * 3 / 4
+    return max(10, min(budget, time_left / 2)) / 1000  # never risk more than half the clock, but take 10 ms
+
+
+# Runs one go command's search on a background thread, so the input loop stays free to answer stop and isready.
+class SearchThread:
+    def __init__(self, board, params, use_book):
+        self.board = board
+        self.infinite = "infinite" in params
+        self.pondering = "ponder" in params
+        self.move_time = allocate_time(params, board.white_to_move)
+        self.hold = threading.Event()  # infinite and ponder searches wait on this before answering
+        self.search = Search(board, params.get("depth", MAX_PLY - 1), None if self.pondering else self.move_time,
+                             params.get("nodes"), on_iteration=self.report)
+        self.use_book = use_book and not self.infinite and not self.pondering
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def report(self, stats):
+        pv = principal_variation(self.board, self.search.table, stats.depth) or [stats.best_move]
+        send(f"info depth {stats.depth} seldepth {stats.seldepth} score {format_score(stats.score)} "
+             f"nodes {stats.nodes} nps {stats.nodes_per_second:.0f} time {1000 * stats.elapsed:.0f} "
+             f"pv {' '.join(move.get_chess_notation() for move in pv)}")
+
+    def run(self):
+        valid_moves = self.board.get_valid_moves()
+        move = None
+        if self.use_book:
+            book = get_opening_book()
+            move = book.choose_move(self.board, valid_moves) if book is not None else None
+        if move is None and valid_moves:
+            move = self.search.run(valid_moves)
+        if self.infinite or self.pondering:
+            self.hold.wait()  # the protocol forbids bestmove before stop (or ponderhit) in these modes
+        if move is None:
+            send("bestmove 0000")
+            return
+        reply = ""
+        if self.search.best_move is move:
+            self.board.make_move(move)
+            pv = principal_variation(self.board, self.search.table, 1)
+            self.board.undo_move()
+            if pv:
+                reply = f" ponder {pv[0].get_chess_notation()}"
+        send(f"bestmove {move.get_chess_notation()}{reply}")
+
+    def ponderhit(self):
+        # The opponent played the predicted move: keep searching, but now on our own clock.
+        self.pondering = False
+        if self.move_time is not None:
+            self.search.deadline = time.perf_counter() + self.move_time
+        if not self.infinite:
+            self.hold.set()
+
+    def stop(self):
+        self.search.stop()
+        self.hold.set()
+        self.thread.join()
+
+
+def parse_go(tokens):
+    params = {}
+    i = 0
+    while i < len(tokens):
+        name = tokens[i]
+        if name in ("infinite", "ponder"):
+            params[name] = True
+        elif name in ("wtime", "btime", "winc", "binc", "movestogo", "movetime", "nodes", "depth") and \
+                i + 1 < len(tokens):
+            try:
+                params[name] = int(tokens[i + 1])
+            except ValueError:
+                raise ValueError(f"Invalid go {name}: {tokens[i + 1]}") from None
+            i += 1
+        i += 1
+    return params
+
+
+def parse_position(tokens):
+    if tokens[:1] == ["startpos"]:
+        board, rest = Board(START_FEN), tokens[1:]
+    elif tokens[:1] == ["fen"]:
+        end = tokens.index("moves") if "moves" in tokens else len(tokens)
+        board, rest = Board(" ".join(tokens[1:end])), tokens[end:]
+    else:
+        raise ValueError("position needs startpos or fen")
+    for notation in rest[1:] if rest[:1] == ["moves"] else []:
+        board.make_move(find_move(board, notation))
+    return board
+
+
+def main():
+    board = Board()
+    use_book = True
+    search = None
+    for line in sys.stdin:
+        tokens = line.split()
+        if not tokens:
+            continue
+        command = tokens[0]
+        if command in ("stop", "quit", "ucinewgame", "position", "go") and search is not None:
+            search.stop()
+            search = None
+        if command == "uci":
+            send(f"id name {ENGINE_NAME}")
+            send("id author ECE 264")
+            send("option name OwnBook type check default true")
+            send("option name Ponder type check default false")
+            send("uciok")
+        elif command == "isready":
+            send("readyok")
+        elif command == "setoption":
+            text = " ".join(tokens[1:])
+            if text.lower().startswith("name ownbook value"):
+                use_book = tokens[-1].lower() == "true"
+        elif command == "ucinewgame":
+            board = Board()
+            transposition_table.clear()
+        elif command == "position":
+            try:
+                board = parse_position(tokens[1:])
+            except ValueError as error:
+                send(f"info string {error}")
+        elif command == "go":
+            try:
+                search = SearchThread(board, parse_go(tokens[1:]), use_book)
+            except ValueError as error:
+                send(f"info string {error}")
+        elif command == "ponderhit" and search is not None:
+            search.ponderhit()
+        elif command == "quit":
+            break
+
+
+if __name__ == "__main__":
+    main()